@@ -0,0 +1,159 @@
+"""Per-user engagement analytics: likes, comments and new followers received, rolled up by day and week.
+
+`rollup()` (beat, every ANALYTICS_ROLLUP_INTERVAL seconds) adds the likes, comments and follows created
+since its last run to `EngagementRollup` counters. A `RollupWatermark` per source holds the highest row
+id already counted, so a run reads only new rows, by primary key range, however much history there is;
+the counters and the watermarks move in one transaction, every row is counted once. A run takes at most
+ANALYTICS_ROLLUP_BATCH ids of each source per transaction, the first run over an existing database
+backfills all history that way. Rows younger than ANALYTICS_ROLLUP_LAG seconds are left to the next run,
+an id below them still uncommitted would otherwise be skipped for good.
+
+Charts read only the rollups (`series()`), one index range per request. Counts are of events as they
+happened: an unlike, deleted comment or unfollow doesn't take them back. Days are in TIME_ZONE.
+"""
+
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import Count, Max
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from social_media.models import Comment, EngagementRollup, Follow, Like, Post, RollupWatermark
+
+COUNTERS = ("likes", "comments", "new_followers")
+# rows per INSERT of the upsert, 6 parameters each stays below SQLite's variable limit
+UPSERT_CHUNK = 150
+
+
+@dataclass(frozen=True)
+class Source:
+    name: str  # RollupWatermark.source
+    model: type[models.Model]
+    created: str  # timestamp field of `model`
+    counter: str  # EngagementRollup field the rows add to
+    # (after id, until id) -> (user id, day, count) rows
+    counts: Callable[[int, int], models.QuerySet]
+
+
+def _daily(queryset, user, created):
+    return queryset.annotate(day=TruncDate(created)).values_list(user, "day").annotate(Count("pk")).order_by()
+
+
+def _like_counts(after, until):
+    # from the post side, which knows the author; likes of other content types aren't counted
+    return _daily(Post.objects.filter(likes__id__gt=after, likes__id__lte=until), "user_id", "likes__like_date")
+
+
+def _comment_counts(after, until):
+    return _daily(Comment.objects.filter(id__gt=after, id__lte=until), "post__user_id", "comment_date")
+
+
+def _follow_counts(after, until):
+    return _daily(Follow.objects.filter(id__gt=after, id__lte=until), "followee_id", "created_at")
+
+
+SOURCES = (
+    Source("likes", Like, "like_date", "likes", _like_counts),
+    Source("comments", Comment, "comment_date", "comments", _comment_counts),
+    Source("follows", Follow, "created_at", "new_followers", _follow_counts),
+)
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _upsert(deltas):
+    """Add {(user id, period, bucket): {counter: n}} to the rollups, creating missing ones"""
+    quote = connection.ops.quote_name
+    table = quote(EngagementRollup._meta.db_table)
+    columns = [quote(EngagementRollup._meta.get_field(name).column) for name in ("user", "period", "bucket")]
+    counters = [quote(EngagementRollup._meta.get_field(name).column) for name in COUNTERS]
+    updates = ", ".join(f"{column} = {table}.{column} + EXCLUDED.{column}" for column in counters)
+
+    rows = [
+        (user_id, period, connection.ops.adapt_datefield_value(bucket), *(counts.get(name, 0) for name in COUNTERS))
+        for (user_id, period, bucket), counts in deltas.items()
+    ]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_CHUNK):
+            chunk = rows[start : start + UPSERT_CHUNK]
+            values = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(chunk))
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(columns + counters)}) VALUES {values} "
+                f"ON CONFLICT ({', '.join(columns)}) DO UPDATE SET {updates}",
+                [value for row in chunk for value in row],
+            )
+
+
+def _step(cutoff, batch_size) -> tuple[int, bool]:
+    """Roll up one batch of every source, returns (rows counted, whether any source has more)"""
+    RollupWatermark.objects.bulk_create(
+        [RollupWatermark(source=source.name) for source in SOURCES], ignore_conflicts=True
+    )
+    with transaction.atomic():
+        # concurrent runs wait here and then see the watermarks this one moved
+        watermarks = {
+            watermark.source: watermark
+            for watermark in RollupWatermark.objects.select_for_update().filter(
+                source__in=[source.name for source in SOURCES]
+            )
+        }
+        deltas = {}
+        counted = 0
+        more = False
+        for source in SOURCES:
+            watermark = watermarks[source.name]
+            ready = source.model.objects.filter(pk__gt=watermark.last_id, **{f"{source.created}__lte": cutoff})
+            until = ready.aggregate(until=Max("pk"))["until"]
+            if until is None:
+                continue
+            if until > watermark.last_id + batch_size:
+                until, more = watermark.last_id + batch_size, True
+
+            for user_id, day, count in source.counts(watermark.last_id, until):
+                for bucket in ((EngagementRollup.Period.DAY, day), (EngagementRollup.Period.WEEK, week_start(day))):
+                    counts = deltas.setdefault((user_id, *bucket), {})
+                    counts[source.counter] = counts.get(source.counter, 0) + count
+                counted += count
+            watermark.last_id = until
+            watermark.save(update_fields=["last_id", "updated_at"])
+
+        if deltas:
+            _upsert(deltas)
+    return counted, more
+
+
+def rollup(lag=None, batch_size=None) -> int:
+    """Count rows created since the last run into the rollups, returns how many were counted"""
+    lag = settings.ANALYTICS_ROLLUP_LAG if lag is None else lag
+    cutoff = timezone.now() - timedelta(seconds=lag)
+    counted, more = 0, True
+    while more:
+        batch, more = _step(cutoff, batch_size or settings.ANALYTICS_ROLLUP_BATCH)
+        counted += batch
+    return counted
+
+
+def buckets(period, since, until) -> list:
+    """First days of the `period` buckets from the one holding `since` to the one holding `until`"""
+    if period == EngagementRollup.Period.WEEK:
+        since, until, step = week_start(since), week_start(until), timedelta(weeks=1)
+    else:
+        step = timedelta(days=1)
+    return [since + step * i for i in range((until - since) // step + 1)] if since <= until else []
+
+
+def series(user_id, period, since, until) -> list[dict]:
+    """The user's counters per bucket, buckets without engagement included as zeros"""
+    dates = buckets(period, since, until)
+    if not dates:
+        return []
+    rollups = EngagementRollup.objects.filter(
+        user_id=user_id, period=period, bucket__gte=dates[0], bucket__lte=dates[-1]
+    ).values_list("bucket", *COUNTERS)
+    counts = {bucket: values for bucket, *values in rollups}
+    return [{"bucket": day, **dict(zip(COUNTERS, counts.get(day, (0,) * len(COUNTERS))))} for day in dates]
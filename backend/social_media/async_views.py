@@ -0,0 +1,147 @@
+"""Async versions of the hot read endpoints, for ASGI deployments.
+
+DRF views are synchronous, so under ASGI every request to them holds a worker thread for its
+whole duration. These views read with the async ORM and hand the serializers rows that are
+already loaded (related objects selected, viewer state resolved), so serializing never touches
+the database. Payloads and cursors are the same as the DRF endpoints they mirror.
+"""
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views import View
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+from social_media import services
+from social_media.models import Follow, Post, Profile
+from social_media.pagination import (
+    AsyncFollowCursorPagination,
+    AsyncPostCursorPagination,
+    AsyncProfilePostsCursorPagination,
+)
+from social_media.serializers import (
+    FollowerListSerializer,
+    FollowingListSerializer,
+    PostDetailSerializer,
+    PostListSerializer,
+    ProfileSerializer,
+)
+from user.authentication import ClaimsJWTAuthentication
+
+
+class AsyncAPIView(View):
+    """JWT authentication and DRF-style error responses for async views"""
+
+    http_method_names = ["get", "head", "options"]
+    authentication = ClaimsJWTAuthentication()
+    login_required = False
+
+    async def dispatch(self, request, *args, **kwargs):
+        # the DRF request wrapper gives serializers and paginators `query_params` and `user`
+        request = Request(request)
+        try:
+            authenticated = await self.authentication.aauthenticate(request._request)
+            if authenticated is not None:
+                request.user = authenticated[0]
+            if self.login_required and not request.user.is_authenticated:
+                raise NotAuthenticated()
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            return self.handle_exception(request, exc)
+
+    def handle_exception(self, request, exc):
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+        response = JsonResponse(data, status=exc.status_code, encoder=JSONEncoder, safe=False)
+        if exc.status_code == 401:
+            response["WWW-Authenticate"] = self.authentication.authenticate_header(request)
+        return response
+
+    def response(self, data):
+        return JsonResponse(data, encoder=JSONEncoder, safe=False)
+
+    async def get_serializer_context(self, request, posts=()):
+        """Request and the viewer's likes/follows of `posts`, which the post serializers read"""
+        viewer_state = await services.aresolve_viewer_state(
+            [post.pk for post in posts], {post.user_id for post in posts}, request.user
+        )
+        return {"request": request, "view": self, "viewer_state": viewer_state}
+
+
+class AsyncPostListView(AsyncAPIView):
+    """`PostViewSet.list`"""
+
+    async def get(self, request):
+        paginator = AsyncPostCursorPagination()
+        page = await paginator.apaginate_queryset(Post.objects.select_related("user"), request, self)
+        serializer = PostListSerializer(page, many=True, context=await self.get_serializer_context(request, page))
+        return self.response(paginator.get_paginated_data(serializer.data))
+
+
+class AsyncPostDetailView(AsyncAPIView):
+    """`PostViewSet.retrieve`"""
+
+    async def get(self, request, pk):
+        queryset = Post.objects.select_related("user").with_recent_activity(settings.POST_DETAIL_PREVIEW_SIZE)
+        post = await queryset.filter(pk=pk).afirst()
+        if post is None:
+            raise NotFound()
+
+        serializer = PostDetailSerializer(post, context=await self.get_serializer_context(request, [post]))
+        return self.response(serializer.data)
+
+
+class AsyncProfileDetailView(AsyncAPIView):
+    """`ProfileDetailView`, the profile with the first page of its posts"""
+
+    login_required = True
+
+    async def get(self, request, username):
+        profile = await Profile.objects.select_related("user").filter(user__username=username).afirst()
+        if profile is None:
+            raise NotFound()
+
+        paginator = AsyncProfilePostsCursorPagination()
+        posts = Post.objects.filter(user_id=profile.user_id).select_related("user")
+        page = await paginator.apaginate_queryset(posts, request, self)
+        context = await self.get_serializer_context(request, page)
+        posts_page = paginator.get_paginated_data(PostListSerializer(page, many=True, context=context).data)
+
+        serializer = ProfileSerializer(profile, context={**context, "posts_page": posts_page})
+        return self.response(serializer.data)
+
+
+class AsyncFollowListView(AsyncAPIView):
+    """Follows of the profile `username`, filtered by the other user's ?username="""
+
+    serializer_class = None
+    profile_field = None
+    other_field = None
+
+    async def get(self, request, username):
+        queryset = Follow.objects.select_related(self.other_field).filter(
+            **{f"{self.profile_field}__username": username}
+        )
+        other_username = request.query_params.get("username")
+        if other_username:
+            queryset = queryset.filter(**{f"{self.other_field}__username__icontains": other_username})
+
+        paginator = AsyncFollowCursorPagination()
+        page = await paginator.apaginate_queryset(queryset, request, self)
+        serializer = self.serializer_class(page, many=True, context={"request": request})
+        return self.response(paginator.get_paginated_data(serializer.data))
+
+
+class AsyncFollowersView(AsyncFollowListView):
+    """`FollowersViewSet.list`"""
+
+    serializer_class = FollowerListSerializer
+    profile_field = "followee"
+    other_field = "follower"
+
+
+class AsyncFollowingView(AsyncFollowListView):
+    """`FollowingViewSet.list`"""
+
+    serializer_class = FollowingListSerializer
+    profile_field = "follower"
+    other_field = "followee"
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches)
+def check_process_local_cache(app_configs, **kwargs):
+    """Cached payloads, validators, follow sets and replica pins live in the cache, which locmem doesn't share"""
+    if not isinstance(caches["default"], LocMemCache):
+        return []
+    # read replicas pin a user to the primary after a write (social_media/db_router.py), in the cache too
+    return [
+        Warning(
+            f"{name} is on with a per-process cache, other processes serve stale data after writes.",
+            hint="Set REDIS_URL, or turn it off.",
+            id="social_media.W001",
+        )
+        for name in (
+            "RESPONSE_CACHE_ENABLED",
+            "CONDITIONAL_GET_ENABLED",
+            "FOLLOW_GRAPH_CACHE_ENABLED",
+            "REPLICA_DATABASES",
+        )
+        if getattr(settings, name)
+    ]
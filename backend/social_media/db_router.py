@@ -0,0 +1,60 @@
+"""Read replica routing for the REPLICA_DATABASES aliases.
+
+`ReplicaRoutingMiddleware` picks a replica for the reads of safe-method requests and sets
+`read_alias`; writes, unsafe-method requests and everything outside a request (Celery tasks,
+commands, the shell) use the primary. A user who has just written is pinned to the primary
+for REPLICA_PIN_SECONDS, so they read their own writes despite replication lag.
+"""
+
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+read_alias = ContextVar("read_alias", default=None)
+
+
+def _pin_key(user_id) -> str:
+    return f"db_pin:{user_id}"
+
+
+def choose_read_alias(method, user_id):
+    """Replica for this request's reads, None to read from the primary"""
+    if method not in SAFE_METHODS or (user_id is not None and cache.get(_pin_key(user_id))):
+        return None
+    return random.choice(settings.REPLICA_DATABASES)
+
+
+async def achoose_read_alias(method, user_id):
+    if method not in SAFE_METHODS or (user_id is not None and await cache.aget(_pin_key(user_id))):
+        return None
+    return random.choice(settings.REPLICA_DATABASES)
+
+
+def should_pin(method, response, user_id) -> bool:
+    return user_id is not None and method not in SAFE_METHODS and response.status_code < 400
+
+
+def pin_to_primary(user_id):
+    cache.set(_pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+
+
+async def apin_to_primary(user_id):
+    await cache.aset(_pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return read_alias.get() or "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas mirror the primary, rows from either can be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.REPLICA_DATABASES
@@ -0,0 +1,24 @@
+"""Schema helpers shared by migrations, kept free of model imports so any migration can use them."""
+
+
+def create_sqlite_fts_triggers(schema_editor, table, columns):
+    """Triggers syncing `table` into its `<table>_fts` FTS5 table, and a rebuild of the index.
+
+    SQLite drops a table's triggers when a migration remakes it, so later migrations call this again.
+    """
+    quote = schema_editor.quote_name
+    fts = f"{table}_fts"
+    names = ", ".join(quote(column) for column in columns)
+    new_values = ", ".join(f"new.{quote(column)}" for column in columns)
+    old_values = ", ".join(f"old.{quote(column)}" for column in columns)
+    delete = f"INSERT INTO {quote(fts)} ({quote(fts)}, rowid, {names}) VALUES ('delete', old.id, {old_values});"
+    insert = f"INSERT INTO {quote(fts)} (rowid, {names}) VALUES (new.id, {new_values});"
+
+    for suffix in ("_ai", "_ad", "_au"):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {quote(fts + suffix)}")
+    schema_editor.execute(f"CREATE TRIGGER {quote(fts + '_ai')} AFTER INSERT ON {quote(table)} BEGIN {insert} END")
+    schema_editor.execute(f"CREATE TRIGGER {quote(fts + '_ad')} AFTER DELETE ON {quote(table)} BEGIN {delete} END")
+    schema_editor.execute(
+        f"CREATE TRIGGER {quote(fts + '_au')} AFTER UPDATE OF {names} ON {quote(table)} BEGIN {delete} {insert} END"
+    )
+    schema_editor.execute(f"INSERT INTO {quote(fts)} ({quote(fts)}) VALUES ('rebuild')")
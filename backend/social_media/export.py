@@ -0,0 +1,93 @@
+"""Streaming export of a user's posts, comments, likes and follows as NDJSON or CSV.
+
+Rows are read with `.values().iterator(chunk_size=EXPORT_CHUNK_SIZE)` and encoded one at a
+time, so memory stays flat however many rows a user has (server-side cursors on PostgreSQL).
+"""
+
+import csv
+import json
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from social_media.models import Comment, Follow, Like, Post
+
+SECTIONS = ("posts", "comments", "likes", "follows")
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# CSV has one header for every row type, columns a row type doesn't have stay empty
+CSV_COLUMNS = (
+    "type",
+    "id",
+    "date",
+    "post_id",
+    "title",
+    "content",
+    "image",
+    "likes_count",
+    "comments_count",
+    "username",
+)
+
+
+def _rows(queryset, row_type):
+    for row in queryset.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        yield {"type": row_type, **row}
+
+
+def post_rows(user_id):
+    posts = Post.objects.filter(user_id=user_id).order_by("id")
+    return _rows(
+        posts.values("id", "title", "content", "image", "likes_count", "comments_count", date=F("post_date")), "post"
+    )
+
+
+def comment_rows(user_id):
+    comments = Comment.objects.filter(user_id=user_id).order_by("id")
+    return _rows(comments.values("id", "post_id", content=F("comment_text"), date=F("comment_date")), "comment")
+
+
+def like_rows(user_id):
+    post_type = ContentType.objects.get_for_model(Post)
+    likes = Like.objects.filter(user_id=user_id, content_type=post_type).order_by("id")
+    return _rows(likes.values("id", post_id=F("object_id"), date=F("like_date")), "like")
+
+
+def follow_rows(user_id):
+    following = Follow.objects.filter(follower_id=user_id).order_by("id")
+    yield from _rows(following.values("id", username=F("followee__username"), date=F("created_at")), "following")
+    followers = Follow.objects.filter(followee_id=user_id).order_by("id")
+    yield from _rows(followers.values("id", username=F("follower__username"), date=F("created_at")), "follower")
+
+
+SECTION_ROWS = {
+    "posts": post_rows,
+    "comments": comment_rows,
+    "likes": like_rows,
+    "follows": follow_rows,
+}
+
+
+def export_rows(user_id, sections=SECTIONS):
+    for section in sections:
+        yield from SECTION_ROWS[section](user_id)
+
+
+class _Echo:
+    """File-like object for csv.writer that hands back each line instead of buffering it"""
+
+    def write(self, value):
+        return value
+
+
+def encode(rows, export_format):
+    """Lines of `rows` in `export_format`, one string per row (plus the CSV header)"""
+    if export_format == "csv":
+        writer = csv.DictWriter(_Echo(), fieldnames=CSV_COLUMNS, restval="")
+        yield writer.writeheader()
+        for row in rows:
+            yield writer.writerow(row)
+        return
+
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
@@ -0,0 +1,254 @@
+"""Who follows whom: cached followee/follower id sets and the follow/unfollow writes.
+
+Each user's followee and follower ids are cached as a set, loaded from the database on first
+use and written through when follows change, so relationship checks of a whole page cost one
+cache round trip. With Redis the sets are native Redis sets (membership is checked server-side,
+write-through is an atomic SADD/SREM); other backends cache frozensets, which writes delete
+rather than update, a read-modify-write would lose concurrent changes. Every write also moves a
+generation counter of the set, a set loaded from the database is only cached if no write landed
+while it was read. Without FOLLOW_GRAPH_CACHE_ENABLED (off in tests) checks query.
+"""
+
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+from django.db import connection, transaction
+from django.utils import timezone
+from social_media.models import Follow
+
+FOLLOWEES = "followees"
+FOLLOWERS = "followers"
+# member of every cached Redis set, an empty Redis set can't be told from a missing one
+LOADED = 0
+# bump the generation, then SADD/SREM only sets that are cached, so a partial set is never created
+UPDATE_IF_CACHED = """
+redis.call('incr', KEYS[2])
+redis.call('expire', KEYS[2], ARGV[1])
+if redis.call('exists', KEYS[1]) == 1 then return redis.call(ARGV[2], KEYS[1], unpack(ARGV, 3)) end
+"""
+# cache a loaded set unless its generation moved since the load, SADD in chunks below Lua's unpack limit
+FILL_IF_UNCHANGED = """
+if (redis.call('get', KEYS[2]) or '0') ~= ARGV[1] then return 0 end
+redis.call('del', KEYS[1])
+for i = 3, #ARGV, 5000 do redis.call('sadd', KEYS[1], unpack(ARGV, i, math.min(i + 4999, #ARGV))) end
+redis.call('expire', KEYS[1], ARGV[2])
+return 1
+"""
+
+_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    return settings.FOLLOW_GRAPH_CACHE_ENABLED
+
+
+def uses_redis() -> bool:
+    # `cache` is a proxy, the backend itself is in `caches`
+    return isinstance(caches["default"], RedisCache)
+
+
+def _key(kind, user_id):
+    return f"follow_graph:{kind}:{user_id}"
+
+
+def _generation_key(kind, user_id):
+    return f"follow_graph:{kind}:{user_id}:generation"
+
+
+def _load(kind, user_id) -> set:
+    if kind == FOLLOWEES:
+        return set(Follow.objects.filter(follower_id=user_id).values_list("followee_id", flat=True))
+    return set(Follow.objects.filter(followee_id=user_id).values_list("follower_id", flat=True))
+
+
+def _redis_members(kind, user_id, ids) -> set:
+    key = cache.make_and_validate_key(_key(kind, user_id))
+    generation_key = cache.make_and_validate_key(_generation_key(kind, user_id))
+    client = cache._cache.get_client(key, write=True)
+    pipeline = client.pipeline(transaction=False)
+    pipeline.exists(key)
+    pipeline.smismember(key, ids)
+    pipeline.get(generation_key)
+    cached, flags, generation = pipeline.execute()
+    if cached:
+        return {member for member, flag in zip(ids, flags) if flag}
+
+    members = _load(kind, user_id)
+    client.eval(
+        FILL_IF_UNCHANGED,
+        2,
+        key,
+        generation_key,
+        generation or 0,
+        settings.FOLLOW_GRAPH_CACHE_TIMEOUT,
+        LOADED,
+        *members,
+    )
+    return members.intersection(ids)
+
+
+def _cache_members(kind, user_id, ids) -> set:
+    key = _key(kind, user_id)
+    members = cache.get(key)
+    if members is None:
+        generation = cache.get(_generation_key(kind, user_id))
+        members = frozenset(_load(kind, user_id))
+        # check-then-set is atomic within the process only, across processes of a shared
+        # non-Redis cache a write can still slip in, FOLLOW_GRAPH_CACHE_TIMEOUT bounds it
+        with _lock:
+            if cache.get(_generation_key(kind, user_id)) == generation:
+                cache.set(key, members, timeout=settings.FOLLOW_GRAPH_CACHE_TIMEOUT)
+    return members.intersection(ids)
+
+
+def _members(kind, user_id, ids) -> set:
+    """Which of `ids` are in the `kind` set of `user_id`"""
+    ids = list(set(ids) - {user_id})
+    if not ids:
+        return set()
+    if not is_enabled():
+        if kind == FOLLOWEES:
+            follows = Follow.objects.filter(follower_id=user_id, followee_id__in=ids)
+            return set(follows.values_list("followee_id", flat=True))
+        follows = Follow.objects.filter(followee_id=user_id, follower_id__in=ids)
+        return set(follows.values_list("follower_id", flat=True))
+    if uses_redis():
+        return _redis_members(kind, user_id, ids)
+    return _cache_members(kind, user_id, ids)
+
+
+def is_following(user_id, followee_ids) -> set:
+    """Which of `followee_ids` `user_id` follows"""
+    return _members(FOLLOWEES, user_id, followee_ids)
+
+
+async def ais_following(user_id, followee_ids) -> set:
+    """`is_following` for async views"""
+    followee_ids = list(set(followee_ids) - {user_id})
+    if not followee_ids:
+        return set()
+    if not is_enabled():
+        follows = Follow.objects.filter(follower_id=user_id, followee_id__in=followee_ids)
+        return {followee_id async for followee_id in follows.values_list("followee_id", flat=True).aiterator()}
+    # Django's cache clients are synchronous, its async cache API runs them in a thread as well
+    return await sync_to_async(_members)(FOLLOWEES, user_id, followee_ids)
+
+
+def follows_you(user_id, follower_ids) -> set:
+    """Which of `follower_ids` follow `user_id`"""
+    return _members(FOLLOWERS, user_id, follower_ids)
+
+
+def mutual(user_id, other_ids) -> set:
+    """Which of `other_ids` follow `user_id` and are followed back"""
+    return is_following(user_id, other_ids) & follows_you(user_id, other_ids)
+
+
+def _write_through(follower_id, followee_ids, following):
+    updates = [((FOLLOWEES, follower_id), followee_ids)]
+    updates += [((FOLLOWERS, followee_id), {follower_id}) for followee_id in followee_ids]
+
+    if uses_redis():
+        client = cache._cache.get_client(write=True)
+        pipeline = client.pipeline(transaction=False)
+        for (kind, user_id), ids in updates:
+            pipeline.eval(
+                UPDATE_IF_CACHED,
+                2,
+                cache.make_and_validate_key(_key(kind, user_id)),
+                cache.make_and_validate_key(_generation_key(kind, user_id)),
+                settings.FOLLOW_GRAPH_CACHE_TIMEOUT,
+                "sadd" if following else "srem",
+                *ids,
+            )
+        pipeline.execute()
+        return
+
+    generation = time.time_ns()
+    with _lock:
+        cache.set_many(
+            {_generation_key(*scope): generation for scope, _ in updates}, timeout=settings.FOLLOW_GRAPH_CACHE_TIMEOUT
+        )
+        cache.delete_many([_key(*scope) for scope, _ in updates])
+
+
+def record(follower_id, followee_ids, following):
+    """Write `follower_id` (un)following `followee_ids` through to the cached sets once committed"""
+    followee_ids = frozenset(followee_ids)
+    if is_enabled() and followee_ids:
+        transaction.on_commit(lambda: _write_through(follower_id, followee_ids, following))
+
+
+def _follow_sql():
+    quote = connection.ops.quote_name
+    return {
+        "table": quote(Follow._meta.db_table),
+        "follower": quote(Follow._meta.get_field("follower").column),
+        "followee": quote(Follow._meta.get_field("followee").column),
+        "created_at": quote(Follow._meta.get_field("created_at").column),
+    }
+
+
+def follow(follower_id, followee_id) -> bool:
+    """INSERT ... ON CONFLICT DO NOTHING, True if `follower_id` wasn't following yet."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO {table} ({follower}, {followee}, {created_at}) "
+            "VALUES (%(follower_id)s, %(followee_id)s, %(created_at)s) "
+            "ON CONFLICT ({follower}, {followee}) DO NOTHING RETURNING 1".format(**_follow_sql()),
+            {
+                "follower_id": follower_id,
+                "followee_id": followee_id,
+                "created_at": connection.ops.adapt_datetimefield_value(timezone.now()),
+            },
+        )
+        created = cursor.fetchone() is not None
+    if created:
+        record(follower_id, {followee_id}, following=True)
+    return created
+
+
+def unfollow(follower_id, followee_id) -> bool:
+    """One DELETE, True if `follower_id` was following."""
+    deleted, _ = Follow.objects.filter(follower_id=follower_id, followee_id=followee_id).delete()
+    if deleted:
+        record(follower_id, {followee_id}, following=False)
+    return bool(deleted)
+
+
+def follow_many(follower_id, followee_ids) -> list:
+    """Multi-row INSERT ... ON CONFLICT DO NOTHING, returns the followee ids actually followed."""
+    if not followee_ids:
+        return []
+    created_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO {table} ({follower}, {followee}, {created_at}) VALUES {values} "
+            "ON CONFLICT ({follower}, {followee}) DO NOTHING RETURNING {followee}".format(
+                **_follow_sql(), values=", ".join(["(%s, %s, %s)"] * len(followee_ids))
+            ),
+            [value for followee_id in followee_ids for value in (follower_id, followee_id, created_at)],
+        )
+        followed = sorted(followee_id for (followee_id,) in cursor.fetchall())
+    record(follower_id, followed, following=True)
+    return followed
+
+
+def unfollow_many(follower_id, followee_ids) -> list:
+    """One DELETE ... RETURNING, returns the followee ids actually unfollowed."""
+    if not followee_ids:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM {table} WHERE {follower} = %s AND {followee} IN ({ids}) RETURNING {followee}".format(
+                **_follow_sql(), ids=", ".join(["%s"] * len(followee_ids))
+            ),
+            [follower_id, *followee_ids],
+        )
+        unfollowed = sorted(followee_id for (followee_id,) in cursor.fetchall())
+    record(follower_id, unfollowed, following=False)
+    return unfollowed
@@ -0,0 +1,179 @@
+"""Resized, metadata-free WebP/JPEG variants of uploaded post images and profile pictures.
+
+Variants are rendered by the `process_image` task after upload; until it has run the
+serializers point clients at `ImageVariantView`, which queues the task again if it never ran
+or failed (once per IMAGE_RENDER_RETRY seconds) and redirects to the original meanwhile.
+Requests never render, so clients can't make the web process run Pillow. Originals are
+re-encoded without their EXIF (GPS, camera) and XMP metadata when they're saved.
+"""
+
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.urls import reverse
+from PIL import Image, ImageOps
+from social_media import response_cache
+from social_media.models import Post, Profile
+
+# kind -> (model, image field), the variants/dimensions live in "<field>_variants", "<field>_width", ...
+IMAGE_FIELDS = {
+    "post": (Post, "image"),
+    "profile": (Profile, "profile_picture"),
+}
+FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+
+
+# formats that carry EXIF/XMP blocks, the rest is stored as uploaded
+STRIPPED_FORMATS = ("JPEG", "PNG", "WEBP")
+
+
+def get_image(kind, obj):
+    _, field = IMAGE_FIELDS[kind]
+    return getattr(obj, field)
+
+
+def get_variants(kind, obj):
+    """Stored variants of `obj`'s current image, None if missing or rendered for a replaced file."""
+    _, field = IMAGE_FIELDS[kind]
+    variants = getattr(obj, f"{field}_variants")
+    image = getattr(obj, field)
+    if image and variants and variants.get("source") == image.name:
+        return variants
+    return None
+
+
+def _encode(image, image_format) -> bytes:
+    if image_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+    # EXIF (GPS, camera), ICC and XMP blocks are only written when passed explicitly
+    image.info = {}
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=settings.IMAGE_VARIANT_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def strip_metadata(image_file):
+    """`image_file` re-encoded in its own format without metadata, None if there's none to strip"""
+    image_file.open("rb")
+    with Image.open(image_file) as original:
+        if original.format not in STRIPPED_FORMATS:
+            return None
+        image_format = original.format
+        # the EXIF orientation goes with the rest, apply it to the pixels
+        image = ImageOps.exif_transpose(original)
+        image.info = {}
+        buffer = BytesIO()
+        options = {"quality": 95} if image_format in ("JPEG", "WEBP") else {}
+        image.save(buffer, image_format, **options)
+    return ContentFile(buffer.getvalue(), name=os.path.basename(image_file.name))
+
+
+def render_variants(image_file) -> dict:
+    """Save every size/format of `image_file` next to it, returns the variants + original dimensions."""
+    stem, _ = os.path.splitext(image_file.name)
+    files = {}
+
+    with image_file.open("rb"), Image.open(image_file) as original:
+        image = ImageOps.exif_transpose(original)
+        width, height = image.size
+
+        for size_name, size in settings.IMAGE_VARIANT_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((size, size))
+            files[size_name] = {
+                extension: image_file.storage.save(
+                    f"{stem}-{size_name}.{extension}", ContentFile(_encode(resized, image_format))
+                )
+                for extension, image_format in FORMATS.items()
+            }
+
+    return {"source": image_file.name, "width": width, "height": height, "files": files}
+
+
+def delete_variant_files(storage, variants):
+    for formats in (variants or {}).get("files", {}).values():
+        for name in formats.values():
+            storage.delete(name)
+
+
+def process(kind, pk, force=False):
+    """Render and store the variants of one object's image, returns them (None without an image)."""
+    model, field = IMAGE_FIELDS[kind]
+    obj = model.objects.filter(pk=pk).first()
+    if obj is None or not getattr(obj, field):
+        return None
+
+    variants = get_variants(kind, obj)
+    # a size added to IMAGE_VARIANT_SIZES after this image was processed renders them again
+    if variants and not force and set(settings.IMAGE_VARIANT_SIZES) <= set(variants["files"]):
+        return variants
+
+    image_file = getattr(obj, field)
+    variants = render_variants(image_file)
+    # the image may have been replaced meanwhile, then its own task renders it
+    updated = model.objects.filter(pk=pk, **{field: image_file.name}).update(
+        **{
+            f"{field}_variants": variants,
+            f"{field}_width": variants["width"],
+            f"{field}_height": variants["height"],
+        }
+    )
+    if not updated:
+        delete_variant_files(image_file.storage, variants)
+        return None
+
+    delete_variant_files(image_file.storage, getattr(obj, f"{field}_variants"))
+    if response_cache.versions_enabled():
+        scopes = [f"profile:{obj.user_id}"] + ([f"post:{pk}"] if kind == "post" else [])
+        response_cache.bump(*scopes)
+    return variants
+
+
+def variant_url(kind, pk, size, extension) -> tuple:
+    """(storage URL of one variant or of the original until it's rendered, whether it's rendered).
+
+    The URL is None without an image.
+    """
+    model, field = IMAGE_FIELDS[kind]
+    obj = model.objects.filter(pk=pk).first()
+    if obj is None or not getattr(obj, field):
+        return None, False
+
+    image = getattr(obj, field)
+    variants = get_variants(kind, obj)
+    name = variants and variants["files"].get(size, {}).get(extension)
+    return image.storage.url(name or image.name), bool(name)
+
+
+def claim_render(kind, pk) -> bool:
+    """Whether the caller should queue a render of `pk`'s variants, True once per IMAGE_RENDER_RETRY"""
+    return cache.add(f"image_render:{kind}:{pk}", True, timeout=settings.IMAGE_RENDER_RETRY)
+
+
+def variant_urls(kind, obj, request=None):
+    """{size: {format: url}} of `obj`'s image, `ImageVariantView` URLs until the variants exist."""
+    image = get_image(kind, obj)
+    if not image:
+        return None
+
+    variants = get_variants(kind, obj)
+    urls = {}
+    for size_name in settings.IMAGE_VARIANT_SIZES:
+        urls[size_name] = {}
+        for extension in FORMATS:
+            name = variants and variants["files"].get(size_name, {}).get(extension)
+            if name:
+                url = image.storage.url(name)
+            else:
+                url = reverse(
+                    "social_media:image-variant",
+                    kwargs={"kind": kind, "pk": obj.pk, "size": size_name, "extension": extension},
+                )
+            urls[size_name][extension] = request.build_absolute_uri(url) if request else url
+    return urls
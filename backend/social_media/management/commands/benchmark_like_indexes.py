@@ -0,0 +1,151 @@
+import json
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from social_media.models import Follow, Like, Post
+
+BATCH_SIZE = 10_000
+
+
+class Command(BaseCommand):
+    """Django command to compare Like/Follow query plans and latencies without and with the indexes
+
+    Run it against a scratch PostgreSQL database: `--seed` inserts the dataset and the
+    indexes are dropped and recreated while measuring.
+    """
+
+    help = "Benchmark Like/Follow lookups before and after the composite indexes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", action="store_true", help="insert the synthetic dataset first")
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--posts", type=int, default=20_000)
+        parser.add_argument("--likes", type=int, default=1_000_000)
+        parser.add_argument("--follows", type=int, default=200_000)
+        parser.add_argument("--samples", type=int, default=200)
+        parser.add_argument("--output", help="write results as JSON to this file")
+
+    def handle(self, *args, **options) -> None:
+        if connection.vendor != "postgresql":
+            raise CommandError("The benchmark drops constraints in place, which needs PostgreSQL")
+
+        if options["seed"]:
+            self.seed(options["users"], options["posts"], options["likes"], options["follows"])
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+        self.user_ids = list(get_user_model().objects.values_list("id", flat=True))
+        self.post_ids = list(Post.objects.values_list("id", flat=True))
+        if not self.user_ids or not self.post_ids:
+            self.stderr.write("No data to benchmark, run with --seed")
+            return
+        self.post_type = ContentType.objects.get_for_model(Post)
+
+        self.drop_indexes()
+        try:
+            before = self.measure(options["samples"])
+        finally:
+            self.create_indexes()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        after = self.measure(options["samples"])
+
+        for name in before:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f"  before: {before[name]['median_ms']:.3f} ms\n{before[name]['plan']}")
+            self.stdout.write(f"  after:  {after[name]['median_ms']:.3f} ms\n{after[name]['plan']}")
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump({"before": before, "after": after}, output, indent=2)
+
+    def queries(self):
+        """Lookups issued by services.is_liked/remove_like, Post.likes and the followers list"""
+        user_id = random.choice(self.user_ids)
+        post_id = random.choice(self.post_ids)
+        return {
+            "is_liked": Like.objects.filter(content_type=self.post_type, object_id=post_id, user_id=user_id),
+            "post_likes": Like.objects.filter(content_type=self.post_type, object_id=post_id),
+            "viewer_likes_on_page": Like.objects.filter(
+                user_id=user_id, content_type=self.post_type, object_id__in=random.sample(self.post_ids, 20)
+            ),
+            "followers_page": Follow.objects.filter(followee_id=user_id).order_by("-created_at", "-id")[:20],
+        }
+
+    def measure(self, samples):
+        timings = {name: [] for name in self.queries()}
+        for _ in range(samples):
+            for name, queryset in self.queries().items():
+                start = time.perf_counter()
+                list(queryset.values_list("id", flat=True))
+                timings[name].append((time.perf_counter() - start) * 1000)
+
+        return {
+            name: {
+                "median_ms": statistics.median(values),
+                "max_ms": max(values),
+                "plan": queryset.explain(),
+            }
+            for (name, values), queryset in zip(timings.items(), self.queries().values())
+        }
+
+    @staticmethod
+    def drop_indexes():
+        with connection.schema_editor() as editor:
+            for model in (Like, Follow):
+                for constraint in model._meta.constraints:
+                    editor.remove_constraint(model, constraint)
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+
+    @staticmethod
+    def create_indexes():
+        with connection.schema_editor() as editor:
+            for model in (Like, Follow):
+                for constraint in model._meta.constraints:
+                    editor.add_constraint(model, constraint)
+                for index in model._meta.indexes:
+                    editor.add_index(model, index)
+
+    def seed(self, users, posts, likes, follows):
+        User = get_user_model()
+        first_user = User.objects.count()
+        User.objects.bulk_create(
+            (
+                User(username=f"bench_{first_user + i}", email=f"bench_{first_user + i}@example.com")
+                for i in range(users)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        user_ids = list(User.objects.values_list("id", flat=True))
+        Post.objects.bulk_create(
+            (Post(user_id=random.choice(user_ids), title=f"Post {i}", content="") for i in range(posts)),
+            batch_size=BATCH_SIZE,
+        )
+        post_ids = list(Post.objects.values_list("id", flat=True))
+        post_type = ContentType.objects.get_for_model(Post)
+
+        pairs = set()
+        while len(pairs) < min(likes, len(user_ids) * len(post_ids)):
+            pairs.add((random.choice(user_ids), random.choice(post_ids)))
+        Like.objects.bulk_create(
+            (Like(user_id=user_id, content_type=post_type, object_id=post_id) for user_id, post_id in pairs),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+        edges = set()
+        while len(edges) < min(follows, len(user_ids) * (len(user_ids) - 1)):
+            follower, followee = random.sample(user_ids, 2)
+            edges.add((follower, followee))
+        Follow.objects.bulk_create(
+            (Follow(follower_id=follower, followee_id=followee) for follower, followee in edges),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Seeded {len(pairs)} likes and {len(edges)} follows"))
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from threading import local
+
+from asgiref.sync import ThreadSensitiveContext
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from social_media.management.commands.run_benchmarks import percentile
+from social_media.models import Follow, Post
+from user.models import get_cached_user
+from user.serializers import ClaimsTokenObtainPairSerializer
+
+# scenario -> (sync url name, async url name, url argument)
+SCENARIOS = {
+    "posts-list": ("social_media:posts-list", "social_media:async-posts-list", None),
+    "post-detail": ("social_media:posts-detail", "social_media:async-posts-detail", "post"),
+    "profile-detail": ("social_media:profile-detail", "social_media:async-profile-detail", "username"),
+    "followers": ("social_media:user-followers-list", "social_media:async-user-followers", "username"),
+    "following": ("social_media:user-following-list", "social_media:async-user-following", "username"),
+}
+
+
+class Command(BaseCommand):
+    """Django command to compare throughput of the DRF (WSGI) and async (ASGI) read endpoints
+
+    Both handlers run in process on the same requests: WSGI behind a pool of --concurrency
+    threads, like a threaded WSGI server, ASGI with --concurrency requests in flight on one
+    event loop, each in its own sync thread context like `ASGIHandler`. Seed data first with
+    seed_social_graph.
+    """
+
+    help = "Requests/second and p50/p95/p99 of the sync and async read endpoints under concurrency"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="requests per scenario and handler")
+        parser.add_argument("--concurrency", type=int, default=32, help="requests in flight")
+        parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="repeatable, default all")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="write the results as JSON to this file")
+
+    def handle(self, *args, **options) -> None:
+        rng = random.Random(options["seed"])
+        users = list(get_user_model().objects.filter(username__startswith="seed_").order_by("id")[:100])
+        # authors with followers and posts, where reads concentrate
+        authors = list(
+            Follow.objects.values_list("followee__username", flat=True).distinct().order_by("followee__username")[:100]
+        )
+        post_ids = list(Post.objects.order_by("-likes_count", "-id").values_list("id", flat=True)[:100])
+        if not users or not authors or not post_ids:
+            raise CommandError("No seeded data, run seed_social_graph first")
+
+        tokens = [str(ClaimsTokenObtainPairSerializer.get_token(user).access_token) for user in users]
+        # steady state: token users are authenticated from the cached user row
+        for user in users:
+            get_cached_user(user.pk)
+        results = {}
+        with override_settings(ALLOWED_HOSTS=["*"]):
+            for scenario in options["scenario"] or SCENARIOS:
+                sync_name, async_name, argument = SCENARIOS[scenario]
+                calls = []
+                for _ in range(options["requests"]):
+                    args = {None: [], "post": [rng.choice(post_ids)], "username": [rng.choice(authors)]}[argument]
+                    calls.append((reverse(sync_name, args=args), reverse(async_name, args=args), rng.choice(tokens)))
+
+                results[scenario] = {
+                    "wsgi": self.run_wsgi([(path, token) for path, _, token in calls], options["concurrency"]),
+                    "asgi": self.run_asgi([(path, token) for _, path, token in calls], options["concurrency"]),
+                }
+
+        self.print_report(results)
+        if options["output"]:
+            report = {
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "database": connection.vendor,
+                "requests": options["requests"],
+                "concurrency": options["concurrency"],
+                "scenarios": results,
+            }
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
+
+    def run_wsgi(self, calls, concurrency) -> dict:
+        clients = local()
+
+        def request(call):
+            path, token = call
+            if not hasattr(clients, "client"):
+                clients.client = Client()
+            start = time.perf_counter()
+            response = clients.client.get(path, headers={"Authorization": f"Bearer {token}"})
+            return response.status_code, time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            responses = list(executor.map(request, calls))
+        return self.summarize(responses, time.perf_counter() - start)
+
+    def run_asgi(self, calls, concurrency) -> dict:
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request(call):
+            path, token = call
+            async with semaphore, ThreadSensitiveContext():
+                start = time.perf_counter()
+                response = await client.get(path, headers={"Authorization": f"Bearer {token}"})
+                return response.status_code, time.perf_counter() - start
+
+        async def run():
+            return await asyncio.gather(*(request(call) for call in calls))
+
+        start = time.perf_counter()
+        responses = asyncio.run(run())
+        return self.summarize(responses, time.perf_counter() - start)
+
+    def summarize(self, responses, elapsed) -> dict:
+        timings = [seconds * 1000 for _, seconds in responses]
+        statuses = {}
+        for status, _ in responses:
+            statuses[status] = statuses.get(status, 0) + 1
+        return {
+            "requests_per_second": len(responses) / elapsed,
+            "p50_ms": percentile(timings, 50),
+            "p95_ms": percentile(timings, 95),
+            "p99_ms": percentile(timings, 99),
+            "mean_ms": statistics.mean(timings),
+            "statuses": statuses,
+        }
+
+    def print_report(self, results):
+        self.stdout.write(f"{'scenario':<16}{'handler':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for scenario, handlers in results.items():
+            for handler, result in handlers.items():
+                self.stdout.write(
+                    f"{scenario:<16}{handler:<8}{result['requests_per_second']:>10.1f}{result['p50_ms']:>10.2f}"
+                    f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                )
+            speedup = handlers["asgi"]["requests_per_second"] / handlers["wsgi"]["requests_per_second"]
+            self.stdout.write(f"{'':<16}{'asgi/wsgi throughput':<28}{speedup:>10.2f}x")
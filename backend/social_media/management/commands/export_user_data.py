@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from social_media import export
+
+
+class Command(BaseCommand):
+    """Django command to stream a user's posts, comments, likes and follows to a file or stdout"""
+
+    help = "Export a user's data as NDJSON or CSV, row by row"
+
+    def add_arguments(self, parser):
+        parser.add_argument("email", help="email of the user to export")
+        parser.add_argument("--export-format", choices=export.FORMATS, default="ndjson")
+        parser.add_argument("--section", action="append", choices=export.SECTIONS, help="repeatable, default all")
+        parser.add_argument("--output", help="file to write, stdout by default")
+
+    def handle(self, *args, **options) -> None:
+        user_id = get_user_model().objects.filter(email=options["email"]).values_list("id", flat=True).first()
+        if user_id is None:
+            raise CommandError(f"No user with email {options['email']}")
+
+        lines = export.encode(
+            export.export_rows(user_id, options["section"] or export.SECTIONS), options["export_format"]
+        )
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+
+        with open(options["output"], "w", newline="") as output:
+            output.writelines(lines)
+        self.stderr.write(self.style.SUCCESS(f"Exported to {options['output']}"))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from social_media import services
+from social_media.models import Post, Profile
+
+
+class Command(BaseCommand):
+    """Django command to recount denormalized post and profile counters in batches"""
+
+    help = "Recount likes/comments on posts and followers/followees/posts on profiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options) -> None:
+        batch_size = options["batch_size"]
+
+        fixed_posts = self.rebuild(Post.objects.all(), services.rebuild_post_counters, batch_size)
+        self.stdout.write(f"Posts with drifted counters: {fixed_posts}")
+
+        fixed_profiles = self.rebuild(Profile.objects.all(), services.rebuild_profile_counters, batch_size)
+        self.stdout.write(f"Profiles with drifted counters: {fixed_profiles}")
+
+        self.stdout.write(self.style.SUCCESS("Counters rebuilt"))
+
+    @staticmethod
+    def rebuild(queryset, rebuild_batch, batch_size) -> int:
+        """Walk `queryset` by primary key so every batch is a short transaction"""
+        fixed = 0
+        last_pk = 0
+        while True:
+            pks = list(queryset.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                return fixed
+            with transaction.atomic():
+                fixed += rebuild_batch(queryset.filter(pk__in=pks))
+            last_pk = pks[-1]
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from social_media import suggestions
+
+
+class Command(BaseCommand):
+    """Django command to recompute the friend-of-friend follow suggestions of every user
+
+    Beat runs the same refresh nightly (`tasks.refresh_follow_suggestions`), the options override the
+    FOLLOW_SUGGESTIONS_* settings for one run.
+    """
+
+    help = "Recompute friend-of-friend follow suggestions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top-k", type=int, help="suggestions kept per user")
+        parser.add_argument("--max-fanout", type=int, help="followees expanded per user")
+        parser.add_argument("--batch-paths", type=int, help="second-degree paths per batch, bounds memory")
+
+    def handle(self, *args, **options) -> None:
+        start = time.perf_counter()
+        stored = suggestions.refresh(options["top_k"], options["max_fanout"], options["batch_paths"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Stored {stored} follow suggestions in {time.perf_counter() - start:.1f}s")
+        )
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from social_media import analytics
+
+
+class Command(BaseCommand):
+    """Django command to count new likes, comments and follows into the engagement rollups
+
+    Beat runs the same rollup every ANALYTICS_ROLLUP_INTERVAL seconds (`tasks.rollup_engagement`), run it
+    by hand to backfill the rollups of an existing database before the first deploy with analytics.
+    """
+
+    help = "Roll up likes, comments and follows received per user by day and week"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lag", type=int, help="seconds of the newest rows left to the next run")
+        parser.add_argument("--batch-size", type=int, help="ids of each source per transaction")
+
+    def handle(self, *args, **options) -> None:
+        start = time.perf_counter()
+        counted = analytics.rollup(options["lag"], options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {counted} events in {time.perf_counter() - start:.1f}s"))
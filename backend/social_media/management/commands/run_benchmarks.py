@@ -0,0 +1,211 @@
+import json
+import platform
+import random
+import statistics
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from social_media.models import Follow, Like, Post
+from social_media_api.celery import app as celery_app
+
+SCENARIOS = ("posts-list", "post-detail", "profile-detail", "my-profile", "toggle-like", "follow", "unfollow")
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = min(int(round(percent / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+class InProcessClient:
+    """Django test client, requests skip the network and SQL queries can be counted"""
+
+    def __init__(self):
+        self.client = APIClient()
+
+    def login(self, user, password):
+        self.client.force_authenticate(user)
+
+    def request(self, method, path):
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = getattr(self.client, method)(path)
+            elapsed = time.perf_counter() - start
+        return response.status_code, elapsed, len(context.captured_queries)
+
+
+class HttpClient:
+    """Requests against a running server, JWT authenticated as a seeded user"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.tokens = {}
+        self.token = None
+
+    def login(self, user, password):
+        if user.pk in self.tokens:
+            self.token = self.tokens[user.pk]
+            return
+
+        body = json.dumps({"email": user.email, "password": password}).encode()
+        request = urllib.request.Request(
+            self.base_url + reverse("user:token_obtain_pair"),
+            data=body,
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request) as response:
+            self.token = self.tokens[user.pk] = json.load(response)["access"]
+
+    def request(self, method, path):
+        request = urllib.request.Request(
+            self.base_url + path, method=method.upper(), headers={"Authorization": f"Bearer {self.token}"}
+        )
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as error:
+            status = error.code
+        return status, time.perf_counter() - start, None
+
+
+class Command(BaseCommand):
+    """Django command to measure latency percentiles and queries per request of the main endpoints
+
+    Runs in process through the test client by default (queries are counted, Celery tasks run
+    eagerly), or against a live server with --base-url. Seed data first with seed_social_graph.
+    """
+
+    help = "Benchmark posts, post detail, profiles, toggle-like and follow, write p50/p95/p99 as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+        parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests per scenario")
+        parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="repeatable, default all")
+        parser.add_argument("--base-url", help="benchmark a running server instead of the test client")
+        parser.add_argument("--password", default="benchmark", help="password of the seeded users (--base-url)")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="write the results as JSON to this file")
+        parser.add_argument("--compare", help="JSON results of an earlier run to print the change against")
+
+    def handle(self, *args, **options) -> None:
+        self.rng = random.Random(options["seed"])
+        self.users = list(get_user_model().objects.filter(username__startswith="seed_").order_by("id")[:1000])
+        # the most liked posts, where read and write traffic concentrates
+        self.post_ids = list(Post.objects.order_by("-likes_count", "-id").values_list("id", flat=True)[:1000])
+        if len(self.users) < 2 or not self.post_ids:
+            raise CommandError("No seeded data, run seed_social_graph first")
+
+        if options["base_url"]:
+            self.client = HttpClient(options["base_url"])
+        else:
+            self.client = InProcessClient()
+        self.password = options["password"]
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=["*"]):
+            eager = celery_app.conf.task_always_eager
+            celery_app.conf.task_always_eager = True
+            try:
+                for scenario in options["scenario"] or SCENARIOS:
+                    results[scenario] = self.run_scenario(scenario, options["requests"], options["warmup"])
+            finally:
+                celery_app.conf.task_always_eager = eager
+
+        report = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "target": options["base_url"] or "test-client",
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "dataset": {
+                "users": get_user_model().objects.count(),
+                "posts": Post.objects.count(),
+                "likes": Like.objects.count(),
+                "follows": Follow.objects.count(),
+            },
+            "scenarios": results,
+        }
+        previous = None
+        if options["compare"]:
+            with open(options["compare"]) as compare:
+                previous = json.load(compare)["scenarios"]
+        self.print_report(results, previous)
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
+
+    def run_scenario(self, scenario, requests, warmup) -> dict:
+        timings = []
+        queries = []
+        statuses = {}
+        for i in range(warmup + requests):
+            status, elapsed, query_count = self.step(scenario)
+            if i < warmup:
+                continue
+            timings.append(elapsed * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+            if query_count is not None:
+                queries.append(query_count)
+
+        return {
+            "requests": requests,
+            "p50_ms": percentile(timings, 50),
+            "p95_ms": percentile(timings, 95),
+            "p99_ms": percentile(timings, 99),
+            "mean_ms": statistics.mean(timings),
+            "queries_per_request": statistics.mean(queries) if queries else None,
+            "max_queries": max(queries) if queries else None,
+            "statuses": statuses,
+        }
+
+    def step(self, scenario):
+        """One request of `scenario` as a random seeded user"""
+        user, author = self.rng.sample(self.users, 2)
+        post_id = self.rng.choice(self.post_ids)
+        self.client.login(user, self.password)
+
+        if scenario == "posts-list":
+            return self.client.request("get", reverse("social_media:posts-list"))
+        if scenario == "post-detail":
+            return self.client.request("get", reverse("social_media:posts-detail", args=[post_id]))
+        if scenario == "profile-detail":
+            return self.client.request("get", reverse("social_media:profile-detail", args=[author.username]))
+        if scenario == "my-profile":
+            return self.client.request("get", reverse("social_media:my-profile"))
+        if scenario == "toggle-like":
+            return self.client.request("post", reverse("social_media:toggle-like-for-sb", args=[post_id]))
+
+        # follow/unfollow go through a post of the author, the other half of the pair runs unmeasured
+        post_id = Post.objects.filter(user=author).values_list("id", flat=True).first()
+        if post_id is None:
+            return self.step(scenario)
+        follow = reverse("social_media:posts-follow-post-author", args=[post_id])
+        unfollow = reverse("social_media:posts-unfollow-post-author", args=[post_id])
+        if scenario == "follow":
+            self.client.request("post", unfollow)
+            return self.client.request("post", follow)
+        self.client.request("post", follow)
+        return self.client.request("post", unfollow)
+
+    def print_report(self, results, previous):
+        self.stdout.write(f"{'scenario':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}")
+        for scenario, result in results.items():
+            queries = result["queries_per_request"]
+            line = (
+                f"{scenario:<16}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                f"{'-' if queries is None else f'{queries:.1f}':>10}"
+            )
+            if previous and scenario in previous:
+                change = (result["p95_ms"] - previous[scenario]["p95_ms"]) / previous[scenario]["p95_ms"] * 100
+                line += f"   p95 {change:+.1f}%"
+            self.stdout.write(line)
@@ -0,0 +1,133 @@
+import random
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from social_media.models import Comment, Follow, Like, Post, Profile
+
+WORDS = (
+    "travel coffee mountains sunset music football recipe garden city photo weekend code "
+    "books running ocean winter festival market coding startup family friends cinema art"
+).split()
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    """Django command to seed a synthetic social graph for load tests and benchmarks
+
+    Popularity follows a power law: a few authors collect most followers, likes and comments,
+    like on a real network. Rows are inserted with bulk_create, counters are recounted at the end.
+    """
+
+    help = "Seed users, a power-law follow graph, posts, comments and likes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--follows-per-user", type=int, default=20, help="average, exponentially distributed")
+        parser.add_argument("--posts-per-user", type=int, default=5, help="average")
+        parser.add_argument("--comments", type=int, default=20_000)
+        parser.add_argument("--likes", type=int, default=100_000)
+        parser.add_argument("--alpha", type=float, default=1.1, help="power law exponent of author popularity")
+        parser.add_argument("--seed", type=int, default=0, help="random seed, same seed same graph")
+        parser.add_argument("--password", default="benchmark", help="password of every seeded user")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options) -> None:
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+
+        user_ids = self.create_users(options["users"], options["password"])
+        # popularity rank is shuffled, so it doesn't correlate with ids
+        ranked = self.rng.sample(user_ids, len(user_ids))
+        user_weight = {user_id: 1 / (rank + 1) ** options["alpha"] for rank, user_id in enumerate(ranked)}
+        user_cum_weights = list(accumulate(user_weight[user_id] for user_id in ranked))
+
+        def popular_users(k):
+            return self.rng.choices(ranked, cum_weights=user_cum_weights, k=k)
+
+        follows = self.create_follows(user_ids, popular_users, options["follows_per_user"])
+        posts = self.create_posts(popular_users(len(user_ids) * options["posts_per_user"]))
+
+        post_ids = [post_id for post_id, _ in posts]
+        post_cum_weights = list(accumulate(user_weight[author_id] for _, author_id in posts))
+
+        def popular_posts(k):
+            return self.rng.choices(post_ids, cum_weights=post_cum_weights, k=k)
+
+        likes = self.create_likes(user_ids, popular_posts, options["likes"])
+        comments = self.create_comments(user_ids, popular_posts, options["comments"])
+
+        call_command("rebuild_counters", batch_size=self.batch_size, stdout=self.stdout)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {len(user_ids)} users, {follows} follows, {len(posts)} posts, "
+                f"{likes} likes and {comments} comments"
+            )
+        )
+
+    def create_users(self, count, password) -> list:
+        User = get_user_model()
+        first = User.objects.count()
+        # hashing is deliberately slow, every seeded user shares one hash
+        password = make_password(password)
+        users = (
+            User(username=f"seed_{i}", email=f"seed_{i}@example.com", password=password)
+            for i in range(first, first + count)
+        )
+        user_ids = []
+        for batch in batched(users, self.batch_size):
+            user_ids += [user.pk for user in User.objects.bulk_create(batch)]
+
+        profiles = (Profile(user_id=user_id, bio="") for user_id in user_ids)
+        for batch in batched(profiles, self.batch_size):
+            Profile.objects.bulk_create(batch)
+        return user_ids
+
+    def create_follows(self, user_ids, popular_users, average) -> int:
+        def edges():
+            for follower_id in user_ids:
+                count = min(int(self.rng.expovariate(1 / average)) + 1, len(user_ids) - 1)
+                for followee_id in set(popular_users(count)) - {follower_id}:
+                    yield Follow(follower_id=follower_id, followee_id=followee_id)
+
+        total = 0
+        for batch in batched(edges(), self.batch_size):
+            Follow.objects.bulk_create(batch, ignore_conflicts=True)
+            total += len(batch)
+        return total
+
+    def create_posts(self, author_ids) -> list:
+        """Returns (post_id, author_id) pairs."""
+        posts = (Post(user_id=author_id, title=self.sentence(3), content=self.sentence(30)) for author_id in author_ids)
+        created = []
+        for batch in batched(posts, self.batch_size):
+            created += [(post.pk, post.user_id) for post in Post.objects.bulk_create(batch)]
+        return created
+
+    def create_likes(self, user_ids, popular_posts, count) -> int:
+        post_type = ContentType.objects.get_for_model(Post)
+        pairs = set(zip(self.rng.choices(user_ids, k=count), popular_posts(count)))
+        likes = (Like(user_id=user_id, content_type=post_type, object_id=post_id) for user_id, post_id in pairs)
+        for batch in batched(likes, self.batch_size):
+            Like.objects.bulk_create(batch, ignore_conflicts=True)
+        return len(pairs)
+
+    def create_comments(self, user_ids, popular_posts, count) -> int:
+        comments = (
+            Comment(user_id=user_id, post_id=post_id, comment_text=self.sentence(12))
+            for user_id, post_id in zip(self.rng.choices(user_ids, k=count), popular_posts(count))
+        )
+        for batch in batched(comments, self.batch_size):
+            Comment.objects.bulk_create(batch)
+        return count
+
+    def sentence(self, words) -> str:
+        return " ".join(self.rng.choices(WORDS, k=words)).capitalize()
@@ -0,0 +1,95 @@
+"""In-process request metrics exported in the Prometheus text format.
+
+Every worker process keeps its own histograms (scrape each one, or sum them in Prometheus),
+which keeps the hot path to a dict lookup and a lock, with no I/O per request.
+"""
+
+import bisect
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+HISTOGRAMS = {
+    "http_request_duration_seconds": ("Total request latency", LATENCY_BUCKETS),
+    "http_request_db_seconds": ("Time spent in SQL queries", LATENCY_BUCKETS),
+    "http_request_serializer_seconds": ("Time spent in the view outside SQL, mostly serializers", LATENCY_BUCKETS),
+    "http_request_render_seconds": ("Time spent rendering the response body", LATENCY_BUCKETS),
+    "http_request_db_queries": ("SQL queries per request", QUERY_COUNT_BUCKETS),
+}
+COUNTERS = {
+    "http_query_budget_exceeded_total": "Requests that ran more SQL queries than the endpoint budget",
+}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = defaultdict(dict)
+        self.counters = defaultdict(lambda: defaultdict(int))
+
+    def observe(self, name, labels, value):
+        labels = tuple(sorted(labels.items()))
+        with self.lock:
+            histogram = self.histograms[name].get(labels)
+            if histogram is None:
+                histogram = self.histograms[name][labels] = Histogram(HISTOGRAMS[name][1])
+            histogram.observe(value)
+
+    def inc(self, name, labels):
+        with self.lock:
+            self.counters[name][tuple(sorted(labels.items()))] += 1
+
+    def clear(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            for name, (description, _) in HISTOGRAMS.items():
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+                for labels, histogram in sorted(self.histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels, le=bound)} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+            for name, description in COUNTERS.items():
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} counter"]
+                for labels, value in sorted(self.counters[name].items()):
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels, **extra) -> str:
+    pairs = [*labels, *extra.items()]
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+registry = Registry()
+
+
+def metrics_view(request):
+    """Prometheus scrape target, only served with `Authorization: Bearer <METRICS_TOKEN>`."""
+    token = settings.METRICS_TOKEN
+    if not token or request.headers.get("Authorization") != f"Bearer {token}":
+        raise Http404
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4")
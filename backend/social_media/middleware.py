@@ -0,0 +1,231 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from social_media import db_router
+from social_media.metrics import registry
+from user.authentication import ClaimsJWTAuthentication
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def endpoint_name(request, view_func) -> str:
+    """`PostViewSet.list` for viewsets, `ProfileDetailView.get` for API views."""
+    view_class = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+    if view_class is None:
+        return f"{view_func.__module__}.{view_func.__name__}"
+
+    method = request.method.lower()
+    actions = getattr(view_func, "actions", None) or {}
+    return f"{view_class.__name__}.{actions.get(method, method)}"
+
+
+class RequestStats:
+    def __init__(self):
+        self.endpoint = None
+        self.queries = 0
+        self.db_time = 0
+        self.view_started = self.view_finished = None
+        self.view_db_time = 0
+
+    def add_query_wrappers(self):
+        for alias in connections:
+            connections[alias].execute_wrappers.append(self.record_query)
+
+    def remove_query_wrappers(self):
+        for alias in connections:
+            connections[alias].execute_wrappers.remove(self.record_query)
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+
+class QueryMetricsMiddleware:
+    """Query count, DB/serializer/render time and latency per endpoint, exported by `metrics_view`.
+
+    Endpoints listed in QUERY_BUDGETS log a warning when they run more queries than budgeted,
+    or raise QueryBudgetExceeded with QUERY_BUDGET_STRICT (on in tests) to catch N+1 regressions.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        stats = request.metrics = RequestStats()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(stats.record_query))
+            response = self.get_response(request)
+        finished = time.perf_counter()
+
+        if stats.endpoint is not None:
+            self.record(request, response, stats, start, finished)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+
+        stats = request.metrics = RequestStats()
+        start = time.perf_counter()
+        # the async ORM runs queries on the request's sync thread, so the wrappers go on its connections
+        await sync_to_async(stats.add_query_wrappers)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stats.remove_query_wrappers)()
+        finished = time.perf_counter()
+
+        if stats.endpoint is not None:
+            self.record(request, response, stats, start, finished)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = getattr(request, "metrics", None)
+        if stats is not None:
+            stats.endpoint = endpoint_name(request, view_func)
+            stats.view_started = time.perf_counter()
+            stats.view_db_time = stats.db_time
+
+    def process_template_response(self, request, response):
+        """Called between the view and rendering, splits view (serializer) time from render time."""
+        stats = getattr(request, "metrics", None)
+        if stats is not None:
+            stats.view_finished = time.perf_counter()
+            stats.view_db_time = stats.db_time - stats.view_db_time
+        return response
+
+    def record(self, request, response, stats, start, finished):
+        if stats.view_finished is None:
+            # plain HttpResponse: nothing left to render after the view
+            stats.view_finished = finished
+            stats.view_db_time = stats.db_time - stats.view_db_time
+
+        labels = {"endpoint": stats.endpoint}
+        registry.observe(
+            "http_request_duration_seconds",
+            {**labels, "method": request.method, "status": response.status_code},
+            finished - start,
+        )
+        registry.observe("http_request_db_seconds", labels, stats.db_time)
+        registry.observe("http_request_db_queries", labels, stats.queries)
+        registry.observe(
+            "http_request_serializer_seconds",
+            labels,
+            max(stats.view_finished - stats.view_started - stats.view_db_time, 0),
+        )
+        registry.observe("http_request_render_seconds", labels, finished - stats.view_finished)
+
+        budget = settings.QUERY_BUDGETS.get(stats.endpoint)
+        if budget is not None and stats.queries > budget:
+            registry.inc("http_query_budget_exceeded_total", labels)
+            message = f"{stats.endpoint} ran {stats.queries} SQL queries, budget is {budget} ({request.path})"
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+
+class ReplicaRoutingMiddleware:
+    """Sends the reads of safe-method requests to a replica, see `social_media.db_router`.
+
+    The user is identified from the JWT (without a query) or the session, users pinned after
+    a write read from the primary. A no-op without REPLICA_DATABASES.
+    """
+
+    sync_capable = True
+    async_capable = True
+    authentication = ClaimsJWTAuthentication()
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+
+        user_id = self.get_user_id(request)
+        token = db_router.read_alias.set(db_router.choose_read_alias(request.method, user_id))
+        try:
+            response = self.get_response(request)
+        finally:
+            db_router.read_alias.reset(token)
+
+        if db_router.should_pin(request.method, response, user_id):
+            db_router.pin_to_primary(user_id)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return await self.get_response(request)
+
+        user_id = await sync_to_async(self.get_user_id)(request)
+        token = db_router.read_alias.set(await db_router.achoose_read_alias(request.method, user_id))
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_router.read_alias.reset(token)
+
+        if db_router.should_pin(request.method, response, user_id):
+            await db_router.apin_to_primary(user_id)
+        return response
+
+    def get_user_id(self, request):
+        user_id = self.authentication.get_token_user_id(request)
+        if user_id is None and request.user.is_authenticated:
+            user_id = request.user.pk
+        return user_id
+
+
+class RateLimitHeadersMiddleware:
+    """X-RateLimit-Limit/Remaining/Reset of the throttle that counted the request, see `social_media.throttling`"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.add_headers(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.add_headers(request, await self.get_response(request))
+
+    def add_headers(self, request, response):
+        rate_limit = getattr(request, "rate_limit", None)
+        if rate_limit is not None:
+            response["X-RateLimit-Limit"] = rate_limit.limit
+            response["X-RateLimit-Remaining"] = rate_limit.remaining
+            response["X-RateLimit-Reset"] = rate_limit.reset
+        return response
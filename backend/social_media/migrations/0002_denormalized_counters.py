@@ -0,0 +1,70 @@
+# Generated by Django 5.0.6 on 2026-10-18 19:53
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset, field):
+    counts = queryset.order_by().values(field).annotate(total=Count("pk")).values("total")
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def populate_counters(apps, schema_editor):
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    Post = apps.get_model("social_media", "Post")
+    Profile = apps.get_model("social_media", "Profile")
+    Like = apps.get_model("social_media", "Like")
+    Comment = apps.get_model("social_media", "Comment")
+    Follow = apps.get_model("social_media", "Follow")
+
+    post_type = ContentType.objects.filter(app_label="social_media", model="post").first()
+    if post_type:
+        Post.objects.update(
+            likes_count=count_subquery(
+                Like.objects.filter(content_type=post_type, object_id=OuterRef("pk")), "object_id"
+            )
+        )
+    Post.objects.update(comments_count=count_subquery(Comment.objects.filter(post=OuterRef("pk")), "post"))
+    Profile.objects.update(
+        followers_count=count_subquery(Follow.objects.filter(followee=OuterRef("user")), "followee"),
+        followees_count=count_subquery(Follow.objects.filter(follower=OuterRef("user")), "follower"),
+        posts_count=count_subquery(Post.objects.filter(user=OuterRef("user")), "user"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("social_media", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="comments_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="likes_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="profile",
+            name="followees_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="profile",
+            name="followers_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="profile",
+            name="posts_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.0.6 on 2026-10-18 19:56
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def delete_duplicate_likes(apps, schema_editor):
+    """Keep the oldest like per (content_type, object_id, user) so the unique constraint can be added"""
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    Like = apps.get_model("social_media", "Like")
+    Post = apps.get_model("social_media", "Post")
+
+    post_type = ContentType.objects.filter(app_label="social_media", model="post").first()
+    duplicates = (
+        Like.objects.values("content_type", "object_id", "user")
+        .annotate(first_id=Min("id"), total=Count("id"))
+        .filter(total__gt=1)
+    )
+    for duplicate in list(duplicates):
+        Like.objects.filter(
+            content_type=duplicate["content_type"],
+            object_id=duplicate["object_id"],
+            user=duplicate["user"],
+            id__gt=duplicate["first_id"],
+        ).delete()
+        if post_type and duplicate["content_type"] == post_type.id:
+            extra = duplicate["total"] - 1
+            Post.objects.filter(pk=duplicate["object_id"], likes_count__gte=extra).update(
+                likes_count=F("likes_count") - extra
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("social_media", "0004_timeline_entry"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="follow",
+            index=models.Index(
+                fields=["follower", "-created_at", "-id"],
+                name="follow_follower_date_id_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="follow",
+            index=models.Index(
+                fields=["followee", "-created_at", "-id"],
+                include=("follower",),
+                name="follow_followee_date_id_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="like",
+            index=models.Index(
+                fields=["user", "content_type", "object_id"],
+                name="like_user_target_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="follow",
+            constraint=models.UniqueConstraint(fields=("follower", "followee"), name="unique_follow"),
+        ),
+        migrations.AlterUniqueTogether(
+            name="follow",
+            unique_together=set(),
+        ),
+        migrations.RunPython(delete_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="like",
+            constraint=models.UniqueConstraint(fields=("content_type", "object_id", "user"), name="unique_like"),
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.0.6 on 2026-10-18 21:12
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models.functions import Upper
+from social_media.db_utils import create_sqlite_fts_triggers
+
+SEARCH_CONFIG = "english"
+
+# PostgreSQL: expression indexes, they have to stay identical to the expressions in social_media/search.py
+POSTGRESQL_INDEXES = [
+    (
+        "social_media",
+        "Post",
+        GinIndex(
+            SearchVector("title", weight="A", config=SEARCH_CONFIG)
+            + SearchVector("content", weight="B", config=SEARCH_CONFIG),
+            name="post_search_idx",
+        ),
+    ),
+    (
+        "social_media",
+        "Comment",
+        GinIndex(SearchVector("comment_text", config=SEARCH_CONFIG), name="comment_search_idx"),
+    ),
+    # icontains is UPPER(column) LIKE UPPER('%...%'), trigram indexes on UPPER() turn it into an index scan
+    ("social_media", "Post", GinIndex(OpClass(Upper("title"), name="gin_trgm_ops"), name="post_title_trgm_idx")),
+    ("user", "User", GinIndex(OpClass(Upper("username"), name="gin_trgm_ops"), name="user_username_trgm_idx")),
+]
+
+# SQLite: external content FTS5 tables, (model, columns, tokenizer)
+SQLITE_FTS_TABLES = [
+    ("social_media", "Post", ["title", "content"], "porter unicode61"),
+    ("social_media", "Comment", ["comment_text"], "porter unicode61"),
+    ("user", "User", ["username"], "trigram"),
+]
+
+
+def create_postgresql_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for app_label, model_name, index in POSTGRESQL_INDEXES:
+        schema_editor.add_index(apps.get_model(app_label, model_name), index)
+
+
+def drop_postgresql_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for app_label, model_name, index in POSTGRESQL_INDEXES:
+        schema_editor.remove_index(apps.get_model(app_label, model_name), index)
+
+
+def create_sqlite_fts_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    quote = schema_editor.quote_name
+    for app_label, model_name, columns, tokenizer in SQLITE_FTS_TABLES:
+        table = apps.get_model(app_label, model_name)._meta.db_table
+        names = ", ".join(quote(column) for column in columns)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {quote(table + '_fts')} USING fts5({names}, "
+            f"content='{table}', content_rowid='id', tokenize='{tokenizer}')"
+        )
+        create_sqlite_fts_triggers(schema_editor, table, columns)
+
+
+def drop_sqlite_fts_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    quote = schema_editor.quote_name
+    for app_label, model_name, _, _ in SQLITE_FTS_TABLES:
+        fts = f"{apps.get_model(app_label, model_name)._meta.db_table}_fts"
+        for suffix in ("_ai", "_ad", "_au"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {quote(fts + suffix)}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {quote(fts)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("social_media", "0005_like_follow_indexes"),
+        # SQLite remakes tables on AlterField, which drops their triggers: run after the user table is final
+        ("user", "0002_alter_user_managers_alter_user_email"),
+    ]
+
+    operations = [
+        # no-op on other databases
+        TrigramExtension(),
+        migrations.RunPython(create_postgresql_indexes, drop_postgresql_indexes),
+        migrations.RunPython(create_sqlite_fts_tables, drop_sqlite_fts_tables),
+    ]
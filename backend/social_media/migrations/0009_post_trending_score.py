@@ -0,0 +1,43 @@
+# Generated by Django 5.0.6 on 2026-10-18 21:14
+
+from django.conf import settings
+from django.db import migrations, models
+from social_media.db_utils import create_sqlite_fts_triggers
+
+# the post columns 0006_search_indexes indexes
+POST_FTS_COLUMNS = ["title", "content"]
+
+
+def recreate_post_fts_triggers(apps, schema_editor):
+    """Adding a NOT NULL column remakes the post table on SQLite, which drops its search triggers"""
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    table = apps.get_model("social_media", "Post")._meta.db_table
+    create_sqlite_fts_triggers(schema_editor, table, POST_FTS_COLUMNS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("social_media", "0008_follow_suggestion"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # reversed last: removing the column remakes the table again
+        migrations.RunPython(migrations.RunPython.noop, recreate_post_fts_triggers),
+        migrations.AddField(
+            model_name="post",
+            name="trending_score",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("trending_score__gt", 0)),
+                fields=["-trending_score", "-id"],
+                name="post_trending_score_idx",
+            ),
+        ),
+        migrations.RunPython(recreate_post_fts_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-18 21:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("social_media", "0010_engagement_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrendingDecay",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("decayed_at", models.DateTimeField()),
+            ],
+        ),
+    ]
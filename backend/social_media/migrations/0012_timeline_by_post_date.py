@@ -0,0 +1,51 @@
+# Generated by Django 5.0.6 on 2026-10-18 22:26
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 1000
+
+
+def date_entries_by_post(apps, schema_editor):
+    """Entries take their post's date, and every post lands in its author's own timeline"""
+    Post = apps.get_model("social_media", "Post")
+    TimelineEntry = apps.get_model("social_media", "TimelineEntry")
+
+    TimelineEntry.objects.update(created_at=Subquery(Post.objects.filter(pk=OuterRef("post")).values("post_date")))
+    posts = Post.objects.order_by("pk").values_list("id", "user_id", "post_date")
+    last_pk = 0
+    while batch := list(posts.filter(pk__gt=last_pk)[:BATCH_SIZE]):
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(user_id=user_id, post_id=post_id, created_at=post_date)
+                for post_id, user_id, post_date in batch
+            ],
+            ignore_conflicts=True,
+        )
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("social_media", "0011_trending_decay"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="timelineentry",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name="timelineentry",
+            index=models.Index(
+                fields=["user", "-created_at", "-post"],
+                name="timeline_user_date_post_idx",
+            ),
+        ),
+        migrations.RunPython(date_entries_by_post, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,20 @@
+from django.db import transaction
 from rest_framework import status
 from rest_framework.response import Response
-from social_media.models import Follow
+from social_media import follow_graph, services, signals, tasks
+from social_media.models import Follow, Post
+
+
+class ViewerStateMixin:
+    """Resolves per-viewer flags (is_liked, is_following_author) for the serialized posts at once"""
+
+    def get_serializer(self, *args, **kwargs):
+        if args and args[0] is not None:
+            posts = list(args[0]) if kwargs.get("many") else [args[0]]
+            if posts and isinstance(posts[0], Post):
+                kwargs.setdefault("context", self.get_serializer_context())
+                kwargs["context"]["viewer_state"] = services.get_viewer_state(posts, self.request.user)
+        return super().get_serializer(*args, **kwargs)
 
 
 class FollowMixin:
@@ -14,13 +28,15 @@ class FollowMixin:
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        if Follow.objects.filter(follower=follower, followee=followee).exists():
-            return Response(
-                {"detail": "You are already following this user"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        Follow.objects.create(follower=follower, followee=followee)
+        with transaction.atomic():
+            if not follow_graph.follow(follower.id, followee.id):
+                return Response(
+                    {"detail": "You are already following this user"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            services.update_follow_counters(follower.id, followee.id, 1)
+            signals.follow_changed.send(sender=Follow, follower_id=follower.id, followee_id=followee.id)
+            transaction.on_commit(lambda: tasks.backfill_timeline.delay(follower.id, followee.id))
         return Response({"detail": "Successfully followed user"}, status=status.HTTP_201_CREATED)
 
 
@@ -29,13 +45,15 @@ class UnfollowMixin:
         follower = request.user
         followee = author
 
-        if not Follow.objects.filter(follower=follower, followee=followee).exists():
-            return Response(
-                {"detail": "You are not following this user"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        Follow.objects.filter(follower=follower, followee=followee).delete()
+        with transaction.atomic():
+            if not follow_graph.unfollow(follower.id, followee.id):
+                return Response(
+                    {"detail": "You are not following this user"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            services.update_follow_counters(follower.id, followee.id, -1)
+            signals.follow_changed.send(sender=Follow, follower_id=follower.id, followee_id=followee.id)
+            transaction.on_commit(lambda: tasks.prune_timeline.delay(follower.id, followee.id))
         return Response(
             {"detail": "Successfully unfollowed user"},
             status=status.HTTP_204_NO_CONTENT,
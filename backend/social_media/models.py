@@ -4,7 +4,10 @@ import uuid
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models import Count, F, OuterRef, Prefetch, Q, Subquery, Value, Window
+from django.db.models.functions import Coalesce, RowNumber
 from django.template.defaultfilters import slugify
+from django.utils import timezone
 from social_media_api import settings
 
 
@@ -22,47 +25,146 @@ def post_image_file_path(instance, filename):
     return os.path.join("uploads/posts/", filename)
 
 
+def count_subquery(queryset, field):
+    """COUNT(*) of `queryset` rows grouped by `field`, usable as a correlated subquery."""
+    counts = queryset.order_by().values(field).annotate(total=Count("pk")).values("total")
+    return Coalesce(Subquery(counts), Value(0))
+
+
+class CounterQuerySet(models.QuerySet):
+    def live_counters(self) -> dict:
+        """Live count of every stored counter column (source of truth for stored counters)."""
+        raise NotImplementedError
+
+    def with_drifted_counters(self):
+        """Rows whose stored counters differ from the live counts."""
+        live = self.live_counters()
+        drifted = Q()
+        for field in live:
+            drifted |= ~Q(**{field: F(f"{field}_live")})
+        return self.alias(**{f"{field}_live": count for field, count in live.items()}).filter(drifted)
+
+    def recount(self) -> int:
+        """Set stored counters to the live counts in one UPDATE.
+
+        Counts are taken by the UPDATE itself, so `F()` shifts committed meanwhile aren't overwritten.
+        """
+        return self.update(**self.live_counters())
+
+
+class ProfileQuerySet(CounterQuerySet):
+    def live_counters(self) -> dict:
+        return {
+            "followers_count": count_subquery(Follow.objects.filter(followee=OuterRef("user")), "followee"),
+            "followees_count": count_subquery(Follow.objects.filter(follower=OuterRef("user")), "follower"),
+            "posts_count": count_subquery(Post.objects.filter(user=OuterRef("user")), "user"),
+        }
+
+
 class Profile(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="profiles")
     bio = models.CharField(max_length=255)
     profile_picture = models.ImageField(null=True, upload_to=profile_image_file_path)
+    profile_picture_width = models.PositiveIntegerField(null=True, blank=True)
+    profile_picture_height = models.PositiveIntegerField(null=True, blank=True)
+    profile_picture_variants = models.JSONField(null=True, blank=True)
     registration_date = models.DateTimeField(auto_now_add=True)
     last_login = models.DateTimeField(auto_now=True)
+    followers_count = models.PositiveIntegerField(default=0)
+    followees_count = models.PositiveIntegerField(default=0)
+    posts_count = models.PositiveIntegerField(default=0)
+
+    objects = ProfileQuerySet.as_manager()
 
     @property
     def total_followers(self):
-        return self.user.followees.count()
+        return self.followers_count
 
     @property
     def total_followees(self):
-        return self.user.followers.count()
+        return self.followees_count
 
     @property
     def total_posts(self):
-        return self.user.posts.count()
+        return self.posts_count
 
     def __str__(self):
         return f"{self.user}'s profile"
 
 
+class PostQuerySet(CounterQuerySet):
+    def live_counters(self) -> dict:
+        post_type = ContentType.objects.get_for_model(self.model)
+        likes = Like.objects.filter(content_type=post_type, object_id=OuterRef("pk"))
+        return {
+            "likes_count": count_subquery(likes, "object_id"),
+            "comments_count": count_subquery(Comment.objects.filter(post=OuterRef("pk")), "post"),
+        }
+
+    def with_recent_activity(self, limit):
+        """Prefetch the `limit` latest comments and likes of every post with their users.
+
+        Sliced prefetches are one windowed query per relation, however many rows a post has.
+        """
+        return self.prefetch_related(
+            Prefetch(
+                "comments",
+                queryset=Comment.objects.select_related("user").order_by("-comment_date", "-id")[:limit],
+                to_attr="recent_comments",
+            ),
+            # generic relations can't prefetch sliced querysets, rank the likes per post instead
+            Prefetch(
+                "likes",
+                queryset=Like.objects.select_related("user")
+                .annotate(
+                    row_number=Window(
+                        RowNumber(), partition_by="object_id", order_by=(F("like_date").desc(), F("id").desc())
+                    )
+                )
+                .filter(row_number__lte=limit)
+                .order_by("-like_date", "-id"),
+                to_attr="recent_likes",
+            ),
+        )
+
+
 class Post(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="posts")
     title = models.CharField(max_length=255)
     image = models.ImageField(null=True, upload_to=post_image_file_path)
+    image_width = models.PositiveIntegerField(null=True, blank=True)
+    image_height = models.PositiveIntegerField(null=True, blank=True)
+    image_variants = models.JSONField(null=True, blank=True)
     content = models.TextField()
     post_date = models.DateTimeField(auto_now_add=True)
     likes = GenericRelation("Like", related_name="posts")
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    # likes and comments weighted and decaying with TRENDING_HALF_LIFE, maintained with the counters
+    trending_score = models.FloatField(default=0)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-post_date", "-id"], name="post_date_id_idx"),
+            models.Index(fields=["user", "-post_date", "-id"], name="post_user_date_id_idx"),
+            # only posts with recent activity, the index stays small however many posts there are
+            models.Index(
+                fields=["-trending_score", "-id"], name="post_trending_score_idx", condition=Q(trending_score__gt=0)
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
     @property
     def total_likes(self):
-        return self.likes.count()
+        return self.likes_count
 
     @property
     def total_comments(self):
-        return self.comments.count()
+        return self.comments_count
 
 
 class Like(models.Model):
@@ -73,6 +175,15 @@ class Like(models.Model):
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey("content_type", "object_id")
 
+    class Meta:
+        constraints = [
+            # also serves `Post.likes` lookups by its (content_type, object_id) prefix
+            models.UniqueConstraint(fields=["content_type", "object_id", "user"], name="unique_like"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "content_type", "object_id"], name="like_user_target_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user} liked {self.content_object}"
 
@@ -83,6 +194,11 @@ class Comment(models.Model):
     comment_text = models.TextField()
     comment_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-comment_date", "-id"], name="comment_user_date_id_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user} commented {self.post} post"
 
@@ -93,7 +209,102 @@ class Follow(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ("follower", "followee")
+        constraints = [
+            models.UniqueConstraint(fields=["follower", "followee"], name="unique_follow"),
+        ]
+        indexes = [
+            models.Index(fields=["follower", "-created_at", "-id"], name="follow_follower_date_id_idx"),
+            # covering on Postgres: follower ids for fan-out are read from the index only
+            models.Index(
+                fields=["followee", "-created_at", "-id"],
+                include=["follower"],
+                name="follow_followee_date_id_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.follower} follows {self.followee}"
+
+
+class TimelineEntry(models.Model):
+    """Post in a home timeline, its author's own or a follower's"""
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="timeline_entries")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="timeline_entries")
+    # the post's date, timelines are paged by it
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "post"], name="unique_timeline_entry"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-created_at", "-post"], name="timeline_user_date_post_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.post} in {self.user}'s timeline"
+
+
+class FollowSuggestion(models.Model):
+    """Friend-of-friend "who to follow" pick, recomputed in batch by `social_media.suggestions`"""
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="follow_suggestions")
+    suggested = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    # how many of the user's followees follow `suggested`
+    score = models.PositiveIntegerField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            # also the index the suggestions endpoint reads a user's picks in order from
+            models.UniqueConstraint(fields=["user", "rank"], name="unique_follow_suggestion_rank"),
+        ]
+
+    def __str__(self):
+        return f"{self.suggested} suggested to {self.user}"
+
+
+class EngagementRollup(models.Model):
+    """Likes, comments and new followers a user received in one day or week, kept by `social_media.analytics`"""
+
+    class Period(models.TextChoices):
+        DAY = "day"
+        WEEK = "week"
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="engagement_rollups")
+    period = models.CharField(max_length=4, choices=Period.choices)
+    # first day of the bucket, weeks start on Monday
+    bucket = models.DateField()
+    likes = models.PositiveIntegerField(default=0)
+    comments = models.PositiveIntegerField(default=0)
+    new_followers = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # also the index the analytics endpoint reads a user's buckets in order from
+            models.UniqueConstraint(fields=["user", "period", "bucket"], name="unique_engagement_rollup"),
+        ]
+
+    def __str__(self):
+        return f"{self.user}'s engagement in the {self.period} of {self.bucket}"
+
+
+class TrendingDecay(models.Model):
+    """When `services.decay_trending_scores` last decayed the trending scores, a single row"""
+
+    decayed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"trending scores decayed at {self.decayed_at}"
+
+
+class RollupWatermark(models.Model):
+    """Highest row id of `source` counted into the engagement rollups"""
+
+    source = models.CharField(max_length=32, unique=True)
+    last_id = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} rolled up to id {self.last_id}"
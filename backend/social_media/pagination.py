@@ -0,0 +1,111 @@
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """Keyset pagination: every page is an indexed range scan, no OFFSET/COUNT"""
+
+    ordering = "-id"
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class PostCursorPagination(IdCursorPagination):
+    ordering = ("-post_date", "-id")
+
+
+class FeedCursorPagination(IdCursorPagination):
+    """Home timeline pages, `timeline_date` is annotated by `timeline.feed_queryset`"""
+
+    ordering = ("-timeline_date", "-id")
+
+
+class CommentCursorPagination(IdCursorPagination):
+    ordering = ("-comment_date", "-id")
+
+
+class FollowCursorPagination(IdCursorPagination):
+    ordering = ("-created_at", "-id")
+
+
+class LikeCursorPagination(IdCursorPagination):
+    ordering = ("-like_date", "-id")
+
+
+class ProfilePostsCursorPagination(PostCursorPagination):
+    """Posts embedded in the profile page, paged by their own query params"""
+
+    cursor_query_param = "posts_cursor"
+    page_size_query_param = "posts_page_size"
+
+
+class SearchPagination(PageNumberPagination):
+    """Search results are ordered by rank, pages are numbered (matches are bounded, COUNT is cheap)"""
+
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+def _reversed(ordering) -> tuple:
+    return tuple(field[1:] if field.startswith("-") else f"-{field}" for field in ordering)
+
+
+class AsyncCursorPaginationMixin:
+    """`apaginate_queryset`: the CursorPagination page read with the async ORM, same cursors and links.
+
+    Cursors are decoded by `decode_cursor` and links encoded by `get_next_link`/`get_previous_link`
+    as for sync views, only the page query itself is built here.
+    """
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor or (0, False, None)
+
+        queryset = queryset.order_by(*(_reversed(self.ordering) if reverse else self.ordering))
+        order_attr = self.ordering[0].lstrip("-")
+        if current_position is not None:
+            is_reversed = self.ordering[0].startswith("-")
+            lookup = "lt" if reverse != is_reversed else "gt"
+            filter_query = Q(**{f"{order_attr}__{lookup}": current_position})
+            # rows with a NULL ordering value sort last in descending order, don't lose them
+            if reverse or is_reversed:
+                filter_query |= Q(**{f"{order_attr}__isnull": True})
+            queryset = queryset.filter(filter_query)
+
+        # one row more than the page tells whether another page follows
+        results = [obj async for obj in queryset[offset : offset + self.page_size + 1].aiterator()]
+        self.page = results[: self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            value = getattr(results[-1], order_attr)
+            following_position = None if value is None else str(value)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = len(results) > len(self.page)
+            self.next_position, self.previous_position = current_position, following_position
+        else:
+            self.has_next = len(results) > len(self.page)
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position, self.previous_position = following_position, current_position
+        return self.page
+
+    def get_paginated_data(self, data) -> dict:
+        return {"next": self.get_next_link(), "previous": self.get_previous_link(), "results": data}
+
+
+class AsyncPostCursorPagination(AsyncCursorPaginationMixin, PostCursorPagination):
+    pass
+
+
+class AsyncFollowCursorPagination(AsyncCursorPaginationMixin, FollowCursorPagination):
+    pass
+
+
+class AsyncProfilePostsCursorPagination(AsyncCursorPaginationMixin, ProfilePostsCursorPagination):
+    pass
@@ -0,0 +1,67 @@
+"""Queued post creations, written in bulk_create batches by `tasks.flush_post_buffer`.
+
+The buffer is a plain queue on the Celery broker (Redis in docker-compose, in-memory in tests),
+so every web and worker process shares it without another store. Messages are acked only after
+their batch is committed; a batch that fails on something else than its posts goes back to the
+queue. Posts that can't be created (`invalid`, or rejected by the database on their own) are
+moved to a dead letter queue instead, one bad payload must not block every post behind it.
+"""
+
+import logging
+from contextlib import contextmanager
+
+from celery import current_app
+from social_media.models import Post
+
+QUEUE_NAME = "social_media.post_buffer"
+DEAD_LETTER_QUEUE_NAME = "social_media.post_buffer.dead"
+
+logger = logging.getLogger(__name__)
+
+
+def push(user_id, title, content) -> int:
+    """Queue one post, returns how many posts are waiting"""
+    with current_app.connection_for_write() as connection, connection.SimpleQueue(QUEUE_NAME) as queue:
+        queue.put({"user_id": user_id, "title": title, "content": content}, serializer="json")
+        return queue.qsize()
+
+
+@contextmanager
+def take(limit):
+    """Up to `limit` queued posts, acked when the block exits without an error"""
+    with current_app.connection_for_write() as connection, connection.SimpleQueue(QUEUE_NAME) as queue:
+        messages = []
+        while len(messages) < limit:
+            try:
+                messages.append(queue.get(block=False))
+            except queue.Empty:
+                break
+
+        try:
+            yield [message.payload for message in messages]
+        except Exception:
+            for message in messages:
+                message.requeue()
+            raise
+        for message in messages:
+            message.ack()
+
+
+def invalid(post) -> str | None:
+    """Why `post` can't be inserted, None if it looks insertable"""
+    if not isinstance(post, dict) or set(post) != {"user_id", "title", "content"}:
+        return "malformed payload"
+    if not isinstance(post["user_id"], int) or isinstance(post["user_id"], bool):
+        return "user_id is not an integer"
+    if not isinstance(post["title"], str) or not isinstance(post["content"], str):
+        return "title and content must be strings"
+    if len(post["title"]) > Post._meta.get_field("title").max_length:
+        return "title is too long"
+    return None
+
+
+def dead_letter(post, reason):
+    """Park a post that can't be created, for inspection instead of endless retries"""
+    logger.error("Dropping buffered post to %s: %s", DEAD_LETTER_QUEUE_NAME, reason)
+    with current_app.connection_for_write() as connection, connection.SimpleQueue(DEAD_LETTER_QUEUE_NAME) as queue:
+        queue.put({"post": post, "reason": reason}, serializer="json")
@@ -0,0 +1,265 @@
+"""Shared response payloads for the read-heavy post and profile endpoints.
+
+Payloads are cached without per-viewer fields (is_liked, is_following_author), those are
+overlaid on every request from `services.resolve_viewer_state`. Cache keys embed version
+stamps which `signals` bump on writes, so outdated entries are never read, only expire.
+Stamps expire too, after RESPONSE_CACHE_VERSION_TIMEOUT, long after every payload keyed by them.
+The same stamps make the ETag/Last-Modified validators of conditional GETs (`conditional`),
+served with CONDITIONAL_GET_ENABLED whether payloads are cached or not. Both need a cache
+every process shares, stamps bumped in one process' locmem are never seen by the others.
+"""
+
+import hashlib
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from social_media import services
+from social_media.models import Post
+
+STATS_PREFIX = "response_cache:stats"
+STATS_ENDPOINTS = ("posts-list", "posts-detail", "profile-detail")
+EMPTY_VIEWER_STATE = {"liked_post_ids": frozenset(), "followed_author_ids": frozenset()}
+
+
+def is_enabled() -> bool:
+    return settings.RESPONSE_CACHE_ENABLED
+
+
+def conditional_enabled() -> bool:
+    return settings.CONDITIONAL_GET_ENABLED
+
+
+def versions_enabled() -> bool:
+    """Whether writes have to bump version stamps, read by cached payloads and validators"""
+    return is_enabled() or conditional_enabled()
+
+
+def get_versions(*scopes) -> dict:
+    """Version stamps (ns timestamps) of `scopes` like "post:1", created on first use."""
+    keys = {scope: f"version:{scope}" for scope in scopes}
+    found = cache.get_many(keys.values())
+
+    versions = {}
+    missing = {}
+    for scope, key in keys.items():
+        if key not in found:
+            found[key] = missing[key] = time.time_ns()
+        versions[scope] = found[key]
+    if missing:
+        cache.set_many(missing, timeout=settings.RESPONSE_CACHE_VERSION_TIMEOUT)
+    return versions
+
+
+def bump(*scopes):
+    """Invalidate every payload keyed by `scopes`."""
+    now = time.time_ns()
+    cache.set_many({f"version:{scope}": now for scope in scopes}, timeout=settings.RESPONSE_CACHE_VERSION_TIMEOUT)
+
+
+def conditional(request, *scopes):
+    """Validators of a response built from `scopes`, and a 304 if the client's copy is still current.
+
+    Returns ((etag, last_modified), not_modified or None) from version stamps alone, (None, None)
+    without CONDITIONAL_GET_ENABLED. A revalidation costs one cache round trip and no serializer,
+    callers check that the objects behind `scopes` exist first, so no stamp is made up for them.
+    The viewer's profile version is mixed in, following or unfollowing bumps it (is_following_author)
+    and a like bumps the liked post (is_liked).
+    Last-Modified has second precision, ETag (checked first when sent) catches faster changes.
+    """
+    if not conditional_enabled():
+        return None, None
+
+    user_id = request.user.id if request.user.is_authenticated else None
+    if user_id is not None:
+        scopes += (f"profile:{user_id}",)
+    versions = get_versions(*scopes)
+    renderer = getattr(request, "accepted_renderer", None)
+    stamp = repr((user_id, renderer and renderer.format, sorted(versions.items())))
+    validators = (
+        f'"{hashlib.md5(stamp.encode(), usedforsecurity=False).hexdigest()}"',
+        max(versions.values()) // 1_000_000_000,
+    )
+
+    not_modified = get_conditional_response(request, etag=validators[0], last_modified=validators[1])
+    if not_modified is not None:
+        not_modified = with_validators(not_modified, validators)
+    return validators, not_modified
+
+
+def with_validators(response, validators):
+    """`response` with the ETag and Last-Modified of `conditional`, varying by viewer"""
+    # a 304 repeats them, errors don't get any
+    if validators is None or not (200 <= response.status_code < 300 or response.status_code == 304):
+        return response
+    etag, last_modified = validators
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = http_date(last_modified)
+    patch_vary_headers(response, ("Authorization",))
+    return response
+
+
+def _incr(key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+@contextmanager
+def track(endpoint):
+    """Count the request as a hit unless a payload had to be rebuilt, and time it."""
+    outcome = {"hit": True}
+    start = time.perf_counter()
+    yield outcome
+    elapsed_us = int((time.perf_counter() - start) * 1_000_000)
+    kind = "hits" if outcome["hit"] else "misses"
+    _incr(f"{STATS_PREFIX}:{endpoint}:{kind}", 1)
+    _incr(f"{STATS_PREFIX}:{endpoint}:{kind}_us", elapsed_us)
+
+
+def get_stats() -> dict:
+    keys = [
+        f"{STATS_PREFIX}:{endpoint}:{name}"
+        for endpoint in STATS_ENDPOINTS
+        for name in ("hits", "misses", "hits_us", "misses_us")
+    ]
+    values = cache.get_many(keys)
+
+    stats = {}
+    for endpoint in STATS_ENDPOINTS:
+        hits, misses, hits_us, misses_us = (
+            values.get(f"{STATS_PREFIX}:{endpoint}:{name}", 0) for name in ("hits", "misses", "hits_us", "misses_us")
+        )
+        stats[endpoint] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else None,
+            "avg_hit_ms": hits_us / hits / 1000 if hits else None,
+            "avg_miss_ms": misses_us / misses / 1000 if misses else None,
+        }
+    return stats
+
+
+def with_viewer_fields(items, user) -> list:
+    """`items` are (payload, author_id) pairs, returns payload copies with `user`'s flags."""
+    state = services.resolve_viewer_state([data["id"] for data, _ in items], {author for _, author in items}, user)
+
+    results = []
+    for data, author_id in items:
+        data = dict(data)
+        if "is_liked" in data:
+            data["is_liked"] = data["id"] in state["liked_post_ids"]
+        if "is_following_author" in data:
+            if user.is_authenticated and author_id == user.id:
+                data["is_following_author"] = "it's me"
+            else:
+                data["is_following_author"] = author_id in state["followed_author_ids"]
+        results.append(data)
+    return results
+
+
+def post_fragments(post_ids, serializer_class, request, outcome, posts=(), queryset=None) -> dict:
+    """Shared payloads of `post_ids` as {id: (payload, author_id)}, missing ones rebuilt in one query.
+
+    Each fragment is keyed by its post version, so a like only invalidates that one post.
+    `queryset` loads the missing posts, with whatever `serializer_class` needs prefetched.
+    """
+    versions = get_versions(*(f"post:{pk}" for pk in post_ids))
+    keys = {
+        pk: f"fragment:{serializer_class.__name__}:{request.get_host()}:{pk}:{versions[f'post:{pk}']}"
+        for pk in post_ids
+    }
+    found = cache.get_many(keys.values())
+    fragments = {pk: found[key] for pk, key in keys.items() if key in found}
+
+    missing = [pk for pk in post_ids if pk not in fragments]
+    if missing:
+        outcome["hit"] = False
+        loaded = {post.pk: post for post in posts}
+        if queryset is None:
+            queryset = Post.objects.select_related("user")
+        loaded.update(queryset.in_bulk([pk for pk in missing if pk not in loaded]))
+        context = {"request": request, "viewer_state": EMPTY_VIEWER_STATE}
+
+        built = {}
+        for pk in missing:
+            if pk in loaded:
+                post = loaded[pk]
+                fragments[pk] = built[keys[pk]] = (serializer_class(post, context=context).data, post.user_id)
+        cache.set_many(built, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+    return fragments
+
+
+def _page_key(request, scope, version):
+    return f"page:{scope}:{version}:{request.build_absolute_uri()}"
+
+
+def _page_ids_key(request, scope, version):
+    return f"page_ids:{scope}:{version}:{request.build_absolute_uri()}"
+
+
+def page_scopes(request, scope) -> tuple:
+    """(`scope` collection version, scopes of the post list page: the collection and every post on it).
+
+    The scopes are None until the page was built for this collection version, which posts it
+    shows is only known then (see `remember_page`).
+    """
+    version = get_versions(scope)[scope]
+    ids = cache.get(_page_ids_key(request, scope, version))
+    if ids is None:
+        return version, None
+    return version, (scope, *(f"post:{pk}" for pk in ids))
+
+
+def remember_page(request, scope, version, ids):
+    """Record which posts the page shows at collection `version`, read before the page was built"""
+    if conditional_enabled():
+        cache.set(_page_ids_key(request, scope, version), ids, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+
+
+def post_page(request, scope, build_page, serializer_class, outcome) -> dict:
+    """Paginated post list: page envelope keyed by the `scope` collection version + URL.
+
+    `build_page` returns (posts, next_link, previous_link) on a miss.
+    """
+    version = get_versions(scope)[scope]
+    key = _page_key(request, scope, version)
+    envelope = cache.get(key)
+
+    posts = ()
+    if envelope is None:
+        outcome["hit"] = False
+        posts, next_link, previous_link = build_page()
+        envelope = {"ids": [post.pk for post in posts], "next": next_link, "previous": previous_link}
+        cache.set(key, envelope, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+        remember_page(request, scope, version, envelope["ids"])
+
+    fragments = post_fragments(envelope["ids"], serializer_class, request, outcome, posts)
+    items = [fragments[pk] for pk in envelope["ids"] if pk in fragments]
+    return {
+        "next": envelope["next"],
+        "previous": envelope["previous"],
+        "results": with_viewer_fields(items, request.user),
+    }
+
+
+def profile_payload(request, user_id, build, outcome) -> dict:
+    """Profile detail keyed by the profile version + URL (embedded posts page params)."""
+    scope = f"profile:{user_id}"
+    version = get_versions(scope)[scope]
+    key = f"profile:{version}:{request.build_absolute_uri()}"
+    payload = cache.get(key)
+
+    if payload is None:
+        outcome["hit"] = False
+        payload = build()
+        cache.set(key, payload, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+
+    posts = payload["posts"]
+    results = with_viewer_fields([(data, user_id) for data in posts["results"]], request.user)
+    return {**payload, "posts": {**posts, "results": results}}
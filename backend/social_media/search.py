@@ -0,0 +1,92 @@
+"""Ranked full-text search over posts, comments and usernames.
+
+PostgreSQL matches against GIN indexed tsvector expressions (migration 0006 indexes the very
+same expressions) and ranks usernames by trigram similarity. SQLite, used for tests and local
+runs, matches through FTS5 tables kept in sync by triggers and ranks by bm25.
+"""
+
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from social_media.models import Comment, Post
+
+SEARCH_CONFIG = "english"
+# FTS5 trigram tokenizer can't match anything shorter
+MIN_TRIGRAM_LENGTH = 3
+
+
+def post_vector():
+    return SearchVector("title", weight="A", config=SEARCH_CONFIG) + SearchVector(
+        "content", weight="B", config=SEARCH_CONFIG
+    )
+
+
+def comment_vector():
+    return SearchVector("comment_text", config=SEARCH_CONFIG)
+
+
+def fts_table(model) -> str:
+    return f"{model._meta.db_table}_fts"
+
+
+def _fts_match(query) -> str:
+    """Every word as a quoted FTS5 string, so user input can't inject query syntax."""
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in query.split())
+
+
+def _fts_search(queryset, query):
+    """`queryset` rows matching `query`, ranked by bm25 (lower is better, so negated).
+
+    The FTS table is joined once by rowid and matched once, its bm25 is read per joined row.
+    """
+    quote = connection.ops.quote_name
+    table = fts_table(queryset.model)
+    fts = quote(table)
+    # the FTS5 tables have no model, `extra` is the ORM's only way to join one
+    return queryset.extra(
+        select={"rank": f"-bm25({fts})"},
+        tables=[table],
+        where=[
+            f"{fts}.rowid = {quote(queryset.model._meta.db_table)}.{quote(queryset.model._meta.pk.column)}",
+            f"{fts} MATCH %s",
+        ],
+        params=[_fts_match(query)],
+    )
+
+
+def _search_documents(queryset, vector, query):
+    if connection.vendor == "postgresql":
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type="websearch")
+        queryset = queryset.annotate(search=vector(), rank=SearchRank(vector(), search_query)).filter(
+            search=search_query
+        )
+    else:
+        queryset = _fts_search(queryset, query)
+    return queryset.order_by("-rank", "-id")
+
+
+def search_posts(query):
+    """Posts matching `query` in the title (weighted higher) or the content."""
+    return _search_documents(Post.objects.all(), post_vector, query)
+
+
+def search_comments(query):
+    return _search_documents(Comment.objects.all(), comment_vector, query)
+
+
+def search_users(query):
+    """Users whose username contains `query`, closest names first."""
+    User = get_user_model()
+
+    if connection.vendor == "postgresql":
+        # icontains compiles to UPPER(username) LIKE, served by the trigram index on UPPER(username)
+        queryset = User.objects.filter(username__icontains=query).annotate(rank=TrigramSimilarity("username", query))
+    elif len(query) >= MIN_TRIGRAM_LENGTH:
+        queryset = _fts_search(User.objects.all(), query)
+    else:
+        queryset = User.objects.filter(username__icontains=query).annotate(
+            rank=RawSQL("0", [], output_field=FloatField())
+        )
+    return queryset.order_by("-rank", "-id")
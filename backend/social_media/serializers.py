@@ -1,11 +1,27 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from rest_framework import serializers
-from social_media import services
-from social_media.models import Comment, Follow, Like, Post, Profile
+from social_media import follow_graph, images, services
+from social_media.models import Comment, Follow, FollowSuggestion, Like, Post, Profile
+from social_media.pagination import ProfilePostsCursorPagination
 from user.serializers import UserSerializer
 
 
+class ImageVariantsField(serializers.Field):
+    """{size: {format: url}} of the resized image, a URL redirecting to the original until the upload task has run"""
+
+    def __init__(self, kind, **kwargs):
+        self.kind = kind
+        kwargs.update(source="*", read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, obj):
+        return images.variant_urls(self.kind, obj, self.context.get("request"))
+
+
 class MyProfileSerializer(serializers.HyperlinkedModelSerializer):
     user = serializers.CharField(source="user.username", read_only=True)
+    profile_picture_variants = ImageVariantsField("profile")
 
     class Meta:
         model = Profile
@@ -14,16 +30,21 @@ class MyProfileSerializer(serializers.HyperlinkedModelSerializer):
             "bio",
             "user",
             "profile_picture",
+            "profile_picture_width",
+            "profile_picture_height",
+            "profile_picture_variants",
             "total_followers",
             "total_followees",
             "total_posts",
             "registration_date",
             "last_login",
         )
+        read_only_fields = ("profile_picture_width", "profile_picture_height")
 
 
 class ProfileSerializer(serializers.ModelSerializer):
     user = serializers.CharField(source="user.username", read_only=True)
+    profile_picture_variants = ImageVariantsField("profile")
     posts = serializers.SerializerMethodField()
 
     class Meta:
@@ -33,21 +54,39 @@ class ProfileSerializer(serializers.ModelSerializer):
             "bio",
             "user",
             "profile_picture",
+            "profile_picture_width",
+            "profile_picture_height",
+            "profile_picture_variants",
             "total_followers",
             "total_followees",
             "registration_date",
             "last_login",
             "posts",
         )
+        read_only_fields = ("profile_picture_width", "profile_picture_height")
 
     def get_posts(self, profile):
-        posts = profile.user.posts.all()
-        serializer = PostListSerializer(posts, many=True)
-        return serializer.data
+        if "posts_page" in self.context:
+            # already read by an async view
+            return self.context["posts_page"]
+
+        request = self.context.get("request")
+        posts = Post.objects.filter(user_id=profile.user_id).select_related("user")
+        paginator = ProfilePostsCursorPagination()
+        page = paginator.paginate_queryset(posts, request)
+        context = dict(self.context)
+        context.setdefault("viewer_state", services.get_viewer_state(page, request.user))
+        serializer = PostListSerializer(page, many=True, context=context)
+        return {
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            "results": serializer.data,
+        }
 
 
 class PostSerializer(serializers.ModelSerializer):
     user = serializers.CharField(source="user.username", read_only=True)
+    image_variants = ImageVariantsField("post")
     is_following_author = serializers.SerializerMethodField()
 
     class Meta:
@@ -57,27 +96,45 @@ class PostSerializer(serializers.ModelSerializer):
             "user",
             "title",
             "image",
+            "image_width",
+            "image_height",
+            "image_variants",
             "content",
             "post_date",
             "total_likes",
             "total_comments",
             "is_following_author",
         )
+        read_only_fields = ("image_width", "image_height")
 
     def get_is_following_author(self, obj):
         request = self.context.get("request")
         user = request.user if request and hasattr(request, "user") else None
 
-        if obj.user == user:
+        if user and obj.user_id == user.id:
             return "it's me"
 
         if user and user.is_authenticated:
-            return Follow.objects.filter(follower=user, followee=obj.user).exists()
+            viewer_state = self.context.get("viewer_state")
+            if viewer_state is not None:
+                return obj.user_id in viewer_state["followed_author_ids"]
+            return obj.user_id in follow_graph.is_following(user.id, [obj.user_id])
         return False
 
+    def get_is_liked(self, obj) -> bool:
+        """Checks if `request.user` liked (`obj`) post."""
+        viewer_state = self.context.get("viewer_state")
+        if viewer_state is not None:
+            return obj.pk in viewer_state["liked_post_ids"]
+
+        request = self.context.get("request")
+        if request is None:
+            return False
+        return services.is_liked(obj, request.user)
+
 
 class PostListSerializer(PostSerializer):
-    # is_liked = serializers.SerializerMethodField()
+    is_liked = serializers.SerializerMethodField()
     user = serializers.CharField(source="user.username", read_only=True)
 
     class Meta:
@@ -87,22 +144,17 @@ class PostListSerializer(PostSerializer):
             "user",
             "title",
             "image",
+            "image_width",
+            "image_height",
+            "image_variants",
             "content",
             "post_date",
-            # "is_liked",
+            "is_liked",
             "total_likes",
             "total_comments",
             "is_following_author",
         )
-
-    # ?
-    # def get_is_liked(self, obj) -> bool:
-    #     """Checks if `request.user` liked (`obj`) post."""
-    #     if "request" in self.context and self.context["request"] is not None:
-    #         user = self.context["request"].user
-    #         return services.is_liked(obj, user)
-    #     else:
-    #         return False  # or handle this case as per your application's logic
+        read_only_fields = ("image_width", "image_height")
 
 
 class LikeSerializer(serializers.ModelSerializer):
@@ -121,8 +173,9 @@ class PostDetailSerializer(PostSerializer):
     user = serializers.CharField(source="user.username", read_only=True)
     comments = serializers.SerializerMethodField()
     is_liked = serializers.SerializerMethodField()
-    likes = LikeSerializer(many=True, read_only=True)
-    is_following_author = serializers.SerializerMethodField()
+    likes = serializers.SerializerMethodField()
+    comments_url = serializers.HyperlinkedIdentityField(view_name="social_media:posts-comments")
+    likes_url = serializers.HyperlinkedIdentityField(view_name="social_media:posts-likes")
 
     class Meta:
         model = Post
@@ -131,35 +184,38 @@ class PostDetailSerializer(PostSerializer):
             "user",
             "title",
             "image",
+            "image_width",
+            "image_height",
+            "image_variants",
             "content",
             "post_date",
             "is_following_author",
             "is_liked",
             "likes",
+            "likes_url",
             "total_comments",
             "comments",
+            "comments_url",
         )
+        read_only_fields = ("image_width", "image_height")
 
     def get_comments(self, post):
-        comments = post.comments.all()
+        """Latest comments only (all of them are paged at `comments_url`)."""
+        comments = getattr(post, "recent_comments", None)
+        if comments is None:
+            comments = post.comments.select_related("user").order_by("-comment_date", "-id")[
+                : settings.POST_DETAIL_PREVIEW_SIZE
+            ]
         serializer = CommentSerializer(comments, many=True)
         return serializer.data
 
-    def get_is_liked(self, obj) -> bool:
-        """Checks if `request.user` liked (`obj`) post."""
-        user = self.context.get("request").user
-        return services.is_liked(obj, user)
-
-    def get_is_following_author(self, obj):
-        request = self.context.get("request")
-        user = request.user if request and hasattr(request, "user") else None
-
-        if obj.user == user:
-            return "it's me"
-
-        if user and user.is_authenticated:
-            return Follow.objects.filter(follower=user, followee=obj.user).exists()
-        return False
+    def get_likes(self, post):
+        """Latest likes only (all of them are paged at `likes_url`)."""
+        likes = getattr(post, "recent_likes", None)
+        if likes is None:
+            likes = post.likes.select_related("user").order_by("-like_date", "-id")[: settings.POST_DETAIL_PREVIEW_SIZE]
+        serializer = LikeSerializer(likes, many=True)
+        return serializer.data
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -230,12 +286,28 @@ class CommentDetailSerializer(serializers.ModelSerializer):
         )
 
 
+class UserSearchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = get_user_model()
+        fields = ("id", "username")
+
+
 class FollowSerializer(serializers.ModelSerializer):
     class Meta:
         model = Follow
         fields = ("id", "follower", "followee", "created_at")
 
 
+class FollowSuggestionSerializer(serializers.ModelSerializer):
+    user_id = serializers.IntegerField(source="suggested_id", read_only=True)
+    username = serializers.CharField(source="suggested.username", read_only=True)
+    followed_by_your_followees = serializers.IntegerField(source="score", read_only=True)
+
+    class Meta:
+        model = FollowSuggestion
+        fields = ("user_id", "username", "followed_by_your_followees")
+
+
 class EmptySerializer(serializers.Serializer):
     """Serializer for click actions(follow)"""
 
@@ -272,3 +344,30 @@ class FollowerDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = Follow
         fields = ("id", "follower", "created_at")
+
+
+class LikeOperationSerializer(serializers.Serializer):
+    post_id = serializers.IntegerField(min_value=1)
+    action = serializers.ChoiceField(choices=("like", "unlike"))
+
+
+class FollowOperationSerializer(serializers.Serializer):
+    user_id = serializers.IntegerField(min_value=1)
+    action = serializers.ChoiceField(choices=("follow", "unfollow"))
+
+
+class CommentOperationSerializer(serializers.Serializer):
+    post_id = serializers.IntegerField(min_value=1)
+    comment_text = serializers.CharField()
+
+
+class BulkLikeSerializer(serializers.Serializer):
+    operations = LikeOperationSerializer(many=True, allow_empty=False, max_length=settings.BULK_MAX_OPERATIONS)
+
+
+class BulkFollowSerializer(serializers.Serializer):
+    operations = FollowOperationSerializer(many=True, allow_empty=False, max_length=settings.BULK_MAX_OPERATIONS)
+
+
+class BulkCommentSerializer(serializers.Serializer):
+    operations = CommentOperationSerializer(many=True, allow_empty=False, max_length=settings.BULK_MAX_OPERATIONS)
@@ -1,24 +1,413 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
 
-from .models import Like
+from . import follow_graph, signals, tasks
+from .models import Comment, Follow, Like, Post, Profile, TrendingDecay
 
 
-def add_like(obj, user):
-    """Likes `obj`."""
-    obj_type = ContentType.objects.get_for_model(obj)
-    like, is_created = Like.objects.get_or_create(
-        user=user,
-        content_type=obj_type,
-        object_id=obj.id,
+def update_counters(queryset, **deltas):
+    """Shift counter columns of `queryset` rows in one UPDATE, e.g. `likes_count=1`.
+
+    Counters never go below zero, drift is fixed by `rebuild_counters` command.
+    """
+    return queryset.update(**{field: Greatest(F(field) + delta, Value(0)) for field, delta in deltas.items()})
+
+
+def trending_delta(likes_count=0, comments_count=0) -> float:
+    return likes_count * settings.TRENDING_LIKE_WEIGHT + comments_count * settings.TRENDING_COMMENT_WEIGHT
+
+
+def update_post_counters(post_id, **deltas):
+    """Shift post counters and the trending score with them."""
+    return update_counters(Post.objects.filter(pk=post_id), **deltas, trending_score=trending_delta(**deltas))
+
+
+def update_counters_in_bulk(queryset, deltas, key="pk"):
+    """Shift counters of `queryset` rows by {key: {field: delta}}, one UPDATE per distinct set of deltas."""
+    keys = {}
+    for row_key, row_deltas in deltas.items():
+        keys.setdefault(tuple(sorted(row_deltas.items())), []).append(row_key)
+    for row_deltas, row_keys in keys.items():
+        update_counters(queryset.filter(**{f"{key}__in": row_keys}), **dict(row_deltas))
+
+
+def update_post_counters_in_bulk(deltas):
+    """Shift {post_id: {counter: delta}} post counters, and the trending scores with them."""
+    update_counters_in_bulk(
+        Post.objects.all(),
+        {
+            post_id: {**post_deltas, "trending_score": trending_delta(**post_deltas)}
+            for post_id, post_deltas in deltas.items()
+        },
     )
-    return like
 
 
-def remove_like(obj, user):
-    """Delete like from `obj`."""
-    obj_type = ContentType.objects.get_for_model(obj)
-    Like.objects.filter(content_type=obj_type, object_id=obj.id, user=user).delete()
+def decay_trending_scores(now=None) -> int:
+    """Decay trending scores by the time since the last decay, returns how many posts are still trending.
+
+    The decay time is stored in the transaction that decays the scores, so a run after skipped ones
+    makes up for them and a redelivered run only decays the moment since. Scores that would fall
+    below TRENDING_MIN_SCORE drop to 0, which takes the post out of the (partial) trending index,
+    so each run only touches posts with recent activity.
+    """
+    # the first run decays one interval, as if the previous one had just happened
+    first = timezone.now() - timedelta(seconds=settings.TRENDING_DECAY_INTERVAL)
+    TrendingDecay.objects.bulk_create([TrendingDecay(pk=1, decayed_at=first)], ignore_conflicts=True)
+    trending = Post.objects.filter(trending_score__gt=0)
+    with transaction.atomic():
+        # concurrent runs wait here and then decay from the time this one stored
+        last = TrendingDecay.objects.select_for_update().get(pk=1)
+        now = timezone.now() if now is None else now
+        elapsed = (now - last.decayed_at).total_seconds()
+        if elapsed <= 0:
+            return trending.count()
+
+        factor = 0.5 ** (elapsed / settings.TRENDING_HALF_LIFE)
+        trending.filter(trending_score__lt=settings.TRENDING_MIN_SCORE / factor).update(trending_score=0)
+        last.decayed_at = now
+        last.save(update_fields=["decayed_at"])
+        return trending.update(trending_score=F("trending_score") * factor)
+
+
+def update_profile_counters(user_id, **deltas):
+    return update_counters(Profile.objects.filter(user_id=user_id), **deltas)
+
+
+def update_follow_counters(follower_id, followee_id, delta):
+    """Keep both sides of a follow relation in sync."""
+    update_profile_counters(followee_id, followers_count=delta)
+    update_profile_counters(follower_id, followees_count=delta)
+
+
+def rebuild_post_counters(queryset) -> int:
+    """Recount likes/comments of drifted `queryset` posts, returns how many were fixed."""
+    authors = dict(queryset.with_drifted_counters().values_list("id", "user_id"))
+    if authors:
+        Post.objects.filter(pk__in=authors).recount()
+        # the stored counts are shown on the post list as well
+        _posts_changed(Post, set(authors), authors)
+    return len(authors)
+
+
+def rebuild_profile_counters(queryset) -> int:
+    """Recount followers/followees/posts of drifted `queryset` profiles, returns how many were fixed."""
+    users = dict(queryset.with_drifted_counters().values_list("id", "user_id"))
+    if users:
+        Profile.objects.filter(pk__in=users).recount()
+        signals.profiles_changed.send(sender=Profile, user_ids=set(users.values()))
+    return len(users)
+
+
+def _like_params(obj, user):
+    return {
+        "user_id": user.id,
+        "content_type_id": ContentType.objects.get_for_model(obj).id,
+        "object_id": obj.pk,
+        "like_date": connection.ops.adapt_datetimefield_value(timezone.now()),
+    }
+
+
+def _like_sql():
+    """Table/column names of `Like` quoted for raw statements."""
+    quote = connection.ops.quote_name
+    return {
+        "table": quote(Like._meta.db_table),
+        "user": quote(Like._meta.get_field("user").column),
+        "content_type": quote(Like._meta.get_field("content_type").column),
+        "object_id": quote(Like._meta.get_field("object_id").column),
+        "like_date": quote(Like._meta.get_field("like_date").column),
+    }
+
+
+def _insert_like(params) -> bool:
+    """INSERT ... ON CONFLICT DO NOTHING, True if a row was inserted."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO {table} ({user}, {content_type}, {object_id}, {like_date}) "
+            "VALUES (%(user_id)s, %(content_type_id)s, %(object_id)s, %(like_date)s) "
+            "ON CONFLICT ({content_type}, {object_id}, {user}) DO NOTHING RETURNING 1".format(**_like_sql()),
+            params,
+        )
+        return cursor.fetchone() is not None
+
+
+def _insert_likes(user_id, content_type_id, object_ids) -> set:
+    """Multi-row INSERT ... ON CONFLICT DO NOTHING, returns the object ids actually inserted."""
+    if not object_ids:
+        return set()
+    like_date = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO {table} ({user}, {content_type}, {object_id}, {like_date}) VALUES ".format(**_like_sql())
+            + ", ".join(["(%s, %s, %s, %s)"] * len(object_ids))
+            + " ON CONFLICT ({content_type}, {object_id}, {user}) DO NOTHING RETURNING {object_id}".format(
+                **_like_sql()
+            ),
+            [value for object_id in object_ids for value in (user_id, content_type_id, object_id, like_date)],
+        )
+        return {object_id for (object_id,) in cursor.fetchall()}
+
+
+def _delete_likes(user_id, content_type_id, object_ids) -> set:
+    """One DELETE ... RETURNING, returns the object ids actually unliked."""
+    if not object_ids:
+        return set()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM {table} WHERE {user} = %s AND {content_type} = %s AND {object_id} IN ({ids}) "
+            "RETURNING {object_id}".format(**_like_sql(), ids=", ".join(["%s"] * len(object_ids))),
+            [user_id, content_type_id, *object_ids],
+        )
+        return {object_id for (object_id,) in cursor.fetchall()}
+
+
+def _delete_like(params) -> bool:
+    deleted, _ = Like.objects.filter(
+        user_id=params["user_id"],
+        content_type_id=params["content_type_id"],
+        object_id=params["object_id"],
+    ).delete()
+    return bool(deleted)
+
+
+def _toggle_like_postgresql(params):
+    """Delete-or-insert in one statement, returns (deleted, inserted)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "WITH deleted AS ("
+            "  DELETE FROM {table} WHERE {content_type} = %(content_type_id)s"
+            "  AND {object_id} = %(object_id)s AND {user} = %(user_id)s RETURNING 1"
+            "), inserted AS ("
+            "  INSERT INTO {table} ({user}, {content_type}, {object_id}, {like_date})"
+            "  SELECT %(user_id)s, %(content_type_id)s, %(object_id)s, %(like_date)s"
+            "  WHERE NOT EXISTS (SELECT 1 FROM deleted)"
+            "  ON CONFLICT ({content_type}, {object_id}, {user}) DO NOTHING RETURNING 1"
+            ") SELECT (SELECT COUNT(*) FROM deleted), (SELECT COUNT(*) FROM inserted)".format(**_like_sql()),
+            params,
+        )
+        deleted, inserted = cursor.fetchone()
+    return bool(deleted), bool(inserted)
+
+
+def _update_likes_count(obj, delta):
+    """Shift the counter, a missing row means `obj` does not exist (rolls the like back)."""
+    if not update_counters(
+        type(obj).objects.filter(pk=obj.pk), likes_count=delta, trending_score=trending_delta(likes_count=delta)
+    ):
+        raise type(obj).DoesNotExist
+    signals.like_changed.send(sender=Like, post_id=obj.pk)
+
+
+def add_like(obj, user) -> bool:
+    """Likes `obj`, idempotent: False if it was already liked."""
+    with transaction.atomic():
+        created = _insert_like(_like_params(obj, user))
+        if created:
+            _update_likes_count(obj, 1)
+    return created
+
+
+def remove_like(obj, user) -> bool:
+    """Delete like from `obj`, idempotent: False if it was not liked, DoesNotExist if `obj` doesn't exist."""
+    with transaction.atomic():
+        deleted = _delete_like(_like_params(obj, user))
+        if deleted:
+            _update_likes_count(obj, -1)
+        elif not type(obj).objects.filter(pk=obj.pk).exists():
+            raise type(obj).DoesNotExist
+    return deleted
+
+
+def toggle_like(obj, user) -> bool:
+    """Likes `obj` or removes the like, returns whether `obj` is liked afterwards.
+
+    Concurrent double-taps can't create duplicates: the insert loses on the unique constraint.
+    """
+    params = _like_params(obj, user)
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            deleted, inserted = _toggle_like_postgresql(params)
+        else:
+            deleted = _delete_like(params)
+            inserted = not deleted and _insert_like(params)
+
+        if deleted or inserted:
+            _update_likes_count(obj, 1 if inserted else -1)
+    return not deleted
+
+
+def bulk_like(user, operations) -> list:
+    """Apply {"post_id", "action": "like"|"unlike"} `operations` of `user` with set-based writes.
+
+    Operations are evaluated in order against the likes read once up front, only the net
+    difference is written, in one transaction. Counters shift by the rows the writes actually
+    inserted/deleted: a like or unlike that raced in turns "liked" into "already_liked" and
+    "unliked" into "not_liked". Returns one {"post_id", "result"} per operation.
+    """
+    post_ids = {operation["post_id"] for operation in operations}
+    authors = dict(Post.objects.filter(pk__in=post_ids).values_list("id", "user_id"))
+    post_type = ContentType.objects.get_for_model(Post)
+    user_likes = Like.objects.filter(user_id=user.id, content_type=post_type)
+    liked_before = set(user_likes.filter(object_id__in=authors).values_list("object_id", flat=True))
+
+    liked = set(liked_before)
+    results = []
+    for operation in operations:
+        post_id = operation["post_id"]
+        if post_id not in authors:
+            result = "not_found"
+        elif operation["action"] == "like":
+            result = "already_liked" if post_id in liked else "liked"
+            liked.add(post_id)
+        else:
+            result = "unliked" if post_id in liked else "not_liked"
+            liked.discard(post_id)
+        results.append({"post_id": post_id, "result": result})
+
+    with transaction.atomic():
+        added = _insert_likes(user.id, post_type.id, sorted(liked - liked_before))
+        removed = _delete_likes(user.id, post_type.id, sorted(liked_before - liked))
+        update_post_counters_in_bulk(
+            {post_id: {"likes_count": 1 if post_id in added else -1} for post_id in added | removed}
+        )
+        _posts_changed(Like, added | removed, authors)
+
+    raced = {"liked": (liked - liked_before) - added, "unliked": (liked_before - liked) - removed}
+    for result in results:
+        if result["post_id"] in raced.get(result["result"], ()):
+            result["result"] = "already_liked" if result["result"] == "liked" else "not_liked"
+    return results
+
+
+def bulk_comment(user, comments) -> list:
+    """Create {"post_id", "comment_text"} `comments` of `user` in one INSERT per batch.
+
+    Returns one {"post_id", "result", "id"} per comment, `id` is None for missing posts.
+    """
+    authors = dict(
+        Post.objects.filter(pk__in={comment["post_id"] for comment in comments}).values_list("id", "user_id")
+    )
+    new_comments = [
+        Comment(user_id=user.id, post_id=comment["post_id"], comment_text=comment["comment_text"])
+        for comment in comments
+        if comment["post_id"] in authors
+    ]
+    with transaction.atomic():
+        created = iter(Comment.objects.bulk_create(new_comments))
+        update_post_counters_in_bulk(
+            {
+                post_id: {"comments_count": count}
+                for post_id, count in Counter(comment.post_id for comment in new_comments).items()
+            }
+        )
+        _posts_changed(Comment, {comment.post_id for comment in new_comments}, authors)
+
+    results = []
+    for comment in comments:
+        if comment["post_id"] in authors:
+            results.append({"post_id": comment["post_id"], "result": "created", "id": next(created).pk})
+        else:
+            results.append({"post_id": comment["post_id"], "result": "not_found", "id": None})
+    return results
+
+
+def bulk_create_posts(posts) -> list:
+    """Create {"user_id", "title", "content"} `posts` in one INSERT, skipping deleted users.
+
+    Model signals don't fire for bulk_create: profile counters are shifted per author, receivers
+    get `posts_changed` and the new posts are fanned out by one task.
+    """
+    existing = set(
+        get_user_model().objects.filter(pk__in={post["user_id"] for post in posts}).values_list("id", flat=True)
+    )
+    new_posts = [
+        Post(user_id=post["user_id"], title=post["title"], content=post["content"])
+        for post in posts
+        if post["user_id"] in existing
+    ]
+    if not new_posts:
+        return []
+
+    with transaction.atomic():
+        created = Post.objects.bulk_create(new_posts)
+        posts_per_author = Counter(post.user_id for post in created)
+        update_counters_in_bulk(
+            Profile.objects.all(),
+            {user_id: {"posts_count": count} for user_id, count in posts_per_author.items()},
+            key="user_id",
+        )
+        author_ids = set(posts_per_author)
+        post_ids = [post.pk for post in created]
+        signals.posts_changed.send(sender=Post, post_ids=post_ids, author_ids=author_ids)
+        transaction.on_commit(lambda: tasks.fan_out_posts.delay(post_ids))
+    return created
+
+
+def _posts_changed(sender, post_ids, authors):
+    """Tell receivers about bulk-written posts, model signals don't fire for set-based writes."""
+    if post_ids:
+        signals.posts_changed.send(sender=sender, post_ids=post_ids, author_ids={authors[pk] for pk in post_ids})
+
+
+def bulk_follow(user, operations) -> list:
+    """Apply {"user_id", "action": "follow"|"unfollow"} `operations` of `user` with set-based writes.
+
+    Same in-order evaluation and race handling as `bulk_like`; timelines are backfilled/pruned by
+    one task each.
+    """
+    followee_ids = {operation["user_id"] for operation in operations}
+    existing = set(get_user_model().objects.filter(pk__in=followee_ids).values_list("id", flat=True))
+    user_follows = Follow.objects.filter(follower_id=user.id)
+    following_before = set(user_follows.filter(followee_id__in=existing).values_list("followee_id", flat=True))
+
+    following = set(following_before)
+    results = []
+    for operation in operations:
+        followee_id = operation["user_id"]
+        if followee_id == user.id:
+            result = "cannot_follow_yourself"
+        elif followee_id not in existing:
+            result = "not_found"
+        elif operation["action"] == "follow":
+            result = "already_following" if followee_id in following else "followed"
+            following.add(followee_id)
+        else:
+            result = "unfollowed" if followee_id in following else "not_following"
+            following.discard(followee_id)
+        results.append({"user_id": followee_id, "result": result})
+
+    with transaction.atomic():
+        followed = follow_graph.follow_many(user.id, sorted(following - following_before))
+        unfollowed = follow_graph.unfollow_many(user.id, sorted(following_before - following))
+        if followed or unfollowed:
+            deltas = {followee_id: {"followers_count": 1} for followee_id in followed}
+            deltas.update({followee_id: {"followers_count": -1} for followee_id in unfollowed})
+            deltas[user.id] = {"followees_count": len(followed) - len(unfollowed)}
+            update_counters_in_bulk(Profile.objects.all(), deltas, key="user_id")
+
+            changed = {user.id, *followed, *unfollowed}
+            signals.profiles_changed.send(sender=Follow, user_ids=changed)
+        if followed:
+            transaction.on_commit(lambda: tasks.backfill_timelines.delay(user.id, followed))
+        if unfollowed:
+            transaction.on_commit(lambda: tasks.prune_timelines.delay(user.id, unfollowed))
+
+    raced = {
+        "followed": (following - following_before) - set(followed),
+        "unfollowed": (following_before - following) - set(unfollowed),
+    }
+    for result in results:
+        if result["user_id"] in raced.get(result["result"], ()):
+            result["result"] = "already_following" if result["result"] == "followed" else "not_following"
+    return results
 
 
 def is_liked(obj, user) -> bool:
@@ -30,6 +419,50 @@ def is_liked(obj, user) -> bool:
     return likes.exists()
 
 
+def get_viewer_state(posts, user) -> dict:
+    """Which of `posts` `user` likes and which of their authors `user` follows.
+
+    Two queries for a whole page instead of two per post, serializers read it from context.
+    """
+    return resolve_viewer_state([post.pk for post in posts], {post.user_id for post in posts}, user)
+
+
+def resolve_viewer_state(post_ids, author_ids, user) -> dict:
+    state = {"liked_post_ids": set(), "followed_author_ids": set()}
+    if not user or not user.is_authenticated or not post_ids:
+        return state
+
+    post_type = ContentType.objects.get_for_model(Post)
+    state["liked_post_ids"] = set(
+        Like.objects.filter(user_id=user.id, content_type=post_type, object_id__in=post_ids).values_list(
+            "object_id", flat=True
+        )
+    )
+
+    state["followed_author_ids"] = follow_graph.is_following(user.id, author_ids)
+    return state
+
+
+async def aresolve_viewer_state(post_ids, author_ids, user) -> dict:
+    """`resolve_viewer_state` for async views."""
+    state = {"liked_post_ids": set(), "followed_author_ids": set()}
+    if not user or not user.is_authenticated or not post_ids:
+        return state
+
+    # Django 5.0 has no `aget_for_model`, the content type is matched in the same query instead
+    opts = Post._meta
+    likes = Like.objects.filter(
+        user_id=user.id,
+        content_type__app_label=opts.app_label,
+        content_type__model=opts.model_name,
+        object_id__in=post_ids,
+    )
+    state["liked_post_ids"] = {post_id async for post_id in likes.values_list("object_id", flat=True).aiterator()}
+
+    state["followed_author_ids"] = await follow_graph.ais_following(user.id, author_ids)
+    return state
+
+
 def get_likes(obj):
     """List of all users that likes `obj`."""
     obj_type = ContentType.objects.get_for_model(obj)
@@ -1,10 +1,102 @@
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from social_media.models import Profile
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+from social_media import images, response_cache, tasks
+from social_media.models import Comment, Post, Profile
+
+# set-based writes (raw SQL, queryset.delete) don't send model signals, services send these instead
+like_changed = Signal()  # post_id, author_id (None if unknown)
+follow_changed = Signal()  # follower_id, followee_id
+# bulk writes, one signal for the whole batch
+posts_changed = Signal()  # post_ids, author_ids
+profiles_changed = Signal()  # user_ids
+
+
+def bump_on_commit(*scopes):
+    if response_cache.versions_enabled():
+        transaction.on_commit(lambda: response_cache.bump(*scopes))
 
 
 @receiver(signal=post_save, sender=get_user_model())
 def create_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
+    else:
+        bump_on_commit(f"profile:{instance.pk}")
+
+
+@receiver(signal=post_save, sender=Profile)
+def invalidate_profile(sender, instance, **kwargs):
+    bump_on_commit(f"profile:{instance.user_id}")
+
+
+@receiver(signal=pre_save, sender=Post)
+@receiver(signal=pre_save, sender=Profile)
+def strip_uploaded_image(sender, instance, **kwargs):
+    kind = "post" if sender is Post else "profile"
+    image = images.get_image(kind, instance)
+    # only a new upload, stored files were stripped when they were saved
+    if image and not image._committed:
+        stripped = images.strip_metadata(image)
+        if stripped is not None:
+            setattr(instance, images.IMAGE_FIELDS[kind][1], stripped)
+
+
+@receiver(signal=post_save, sender=Post)
+@receiver(signal=post_save, sender=Profile)
+def process_uploaded_image(sender, instance, **kwargs):
+    kind = "post" if sender is Post else "profile"
+    if images.get_image(kind, instance) and not images.get_variants(kind, instance):
+        transaction.on_commit(lambda: tasks.process_image.delay(kind, instance.pk))
+
+
+@receiver(signal=post_save, sender=Post)
+@receiver(signal=post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    bump_on_commit("posts", f"post:{instance.pk}", f"profile:{instance.user_id}")
+
+
+@receiver(signal=post_save, sender=Comment)
+@receiver(signal=post_delete, sender=Comment)
+def invalidate_commented_post(sender, instance, **kwargs):
+    scopes = [f"post:{instance.post_id}"]
+    # the embedded profile posts show comment counts, don't query the post just to find its author
+    if Comment._meta.get_field("post").is_cached(instance):
+        scopes.append(f"profile:{instance.post.user_id}")
+    bump_on_commit(*scopes)
+
+
+@receiver(signal=like_changed)
+def invalidate_liked_post(sender, post_id, author_id=None, **kwargs):
+    if not response_cache.versions_enabled():
+        return
+
+    def bump():
+        user_id = author_id
+        if user_id is None:
+            user_id = Post.objects.filter(pk=post_id).values_list("user_id", flat=True).first()
+        response_cache.bump(f"post:{post_id}", f"profile:{user_id}")
+
+    transaction.on_commit(bump)
+
+
+@receiver(signal=follow_changed)
+def invalidate_follow_profiles(sender, follower_id, followee_id, **kwargs):
+    bump_on_commit(f"profile:{follower_id}", f"profile:{followee_id}")
+
+
+@receiver(signal=posts_changed)
+def invalidate_posts(sender, post_ids, author_ids, **kwargs):
+    # posts created in bulk also change the post list, like a single `invalidate_post`
+    collection = ("posts",) if sender is Post else ()
+    bump_on_commit(
+        *collection,
+        *(f"post:{post_id}" for post_id in post_ids),
+        *(f"profile:{user_id}" for user_id in author_ids),
+    )
+
+
+@receiver(signal=profiles_changed)
+def invalidate_profiles(sender, user_ids, **kwargs):
+    bump_on_commit(*(f"profile:{user_id}" for user_id in user_ids))
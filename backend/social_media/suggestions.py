@@ -0,0 +1,244 @@
+"""Batch friend-of-friend "who to follow" suggestions, stored as `FollowSuggestion` rows.
+
+The whole follow graph is loaded into numpy arrays: user ids are mapped to dense indices and
+followees kept in CSR form (`indptr`/`indices`). Users are then processed in batches cut so each
+holds about FOLLOW_SUGGESTIONS_BATCH_PATHS second-degree paths: every path user -> followee ->
+candidate is one pair key, candidates the user already follows are dropped, and counting the
+unique keys scores each candidate by how many of the user's followees follow them. Only the first
+FOLLOW_SUGGESTIONS_MAX_FANOUT followees of a user are expanded, which bounds a batch's work.
+
+On PostgreSQL edges are read and suggestions written with binary COPY, parsed and built as numpy
+record arrays, so no Python object is created per row; other databases use the ORM.
+"""
+
+import io
+from dataclasses import dataclass
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from social_media.models import Follow, FollowSuggestion
+
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + bytes(8)  # signature, flags, header extension length
+PGCOPY_TRAILER = b"\xff\xff"
+# binary COPY tuples: field count, then length and value of every field
+EDGE_ROW = np.dtype(
+    [("fields", ">i2"), ("follower_len", ">i4"), ("follower", ">i8"), ("followee_len", ">i4"), ("followee", ">i8")]
+)
+SUGGESTION_ROW = np.dtype(
+    [
+        ("fields", ">i2"),
+        ("user_len", ">i4"),
+        ("user", ">i8"),
+        ("suggested_len", ">i4"),
+        ("suggested", ">i8"),
+        ("score_len", ">i4"),
+        ("score", ">i4"),
+        ("rank_len", ">i4"),
+        ("rank", ">i2"),
+    ]
+)
+
+
+@dataclass
+class FollowGraph:
+    user_ids: np.ndarray  # dense index -> user id, ascending
+    indptr: np.ndarray  # followees of user i are indices[indptr[i]:indptr[i + 1]]
+    indices: np.ndarray
+
+    @classmethod
+    def from_edges(cls, followers, followees):
+        user_ids, dense = np.unique(np.concatenate([followers, followees]), return_inverse=True)
+        dense = dense.astype(np.int32)
+        sources, targets = dense[: len(followers)], dense[len(followers) :]
+        indptr = np.zeros(len(user_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(user_ids)), out=indptr[1:])
+        return cls(user_ids, indptr, targets[np.argsort(sources, kind="stable")])
+
+    def neighbours(self, rows, limit=None):
+        """Followees of `rows` concatenated, with the position in `rows` each one belongs to"""
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        if limit is not None:
+            lengths = np.minimum(lengths, limit)
+        owners = np.repeat(np.arange(len(rows)), lengths)
+        offsets = np.arange(len(owners)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return owners, self.indices[np.repeat(starts, lengths) + offsets]
+
+
+@dataclass
+class SuggestionBatch:
+    # the batch replaces suggestions of user ids in [first_user_id, next_user_id), None is an open end
+    first_user_id: int | None
+    next_user_id: int | None
+    user_ids: np.ndarray
+    suggested_ids: np.ndarray
+    scores: np.ndarray
+    ranks: np.ndarray
+
+
+class _CopyReader:
+    """File-like sink for COPY TO STDOUT that parses whole binary tuples as they arrive"""
+
+    def __init__(self, dtype):
+        self.dtype = dtype
+        self.buffer = b""
+        self.chunks = []
+        self.header = True
+
+    def write(self, data):
+        self.buffer += data
+        if self.header:
+            if len(self.buffer) < len(PGCOPY_HEADER):
+                return
+            self.buffer = self.buffer[len(PGCOPY_HEADER) :]
+            self.header = False
+        complete = len(self.buffer) // self.dtype.itemsize * self.dtype.itemsize
+        if complete:
+            self.chunks.append(np.frombuffer(self.buffer[:complete], dtype=self.dtype))
+            self.buffer = self.buffer[complete:]
+
+    def rows(self):
+        return np.concatenate(self.chunks) if self.chunks else np.empty(0, dtype=self.dtype)
+
+
+def _copy_edges():
+    reader = _CopyReader(EDGE_ROW)
+    sql = "COPY {table} ({follower}, {followee}) TO STDOUT WITH (FORMAT binary)".format(
+        table=connection.ops.quote_name(Follow._meta.db_table),
+        follower=connection.ops.quote_name(Follow._meta.get_field("follower").column),
+        followee=connection.ops.quote_name(Follow._meta.get_field("followee").column),
+    )
+    with connection.cursor() as cursor:
+        cursor.copy_expert(sql, reader)
+    rows = reader.rows()
+    return rows["follower"].astype(np.int64), rows["followee"].astype(np.int64)
+
+
+def load_edges():
+    """Follower and followee ids of every follow, as two arrays"""
+    if connection.vendor == "postgresql":
+        return _copy_edges()
+    edges = Follow.objects.values_list("follower_id", "followee_id").iterator(chunk_size=100_000)
+    edges = np.fromiter(edges, dtype=np.dtype((np.int64, 2)))
+    return edges[:, 0], edges[:, 1]
+
+
+def _batches(graph, batch_paths, max_fanout):
+    """Slices of dense rows with about `batch_paths` second-degree paths each"""
+    capped = np.minimum(np.diff(graph.indptr), max_fanout)
+    # paths of user i: capped degrees of their first `capped[i]` followees, summed over a prefix sum
+    prefix = np.concatenate([[0], np.cumsum(capped[graph.indices], dtype=np.int64)])
+    paths = prefix[graph.indptr[:-1] + capped] - prefix[graph.indptr[:-1]]
+    cuts = np.searchsorted(np.cumsum(paths), np.arange(batch_paths, paths.sum(), batch_paths), side="right")
+    bounds = np.unique(np.concatenate([[0], cuts, [len(paths)]]))
+    return zip(bounds[:-1], bounds[1:])
+
+
+def recommend(graph, top_k, max_fanout, batch_paths):
+    """`SuggestionBatch`es covering every user of `graph`, best `top_k` candidates per user"""
+    user_count = len(graph.user_ids)
+    for start, stop in _batches(graph, batch_paths, max_fanout):
+        rows = np.arange(start, stop)
+        owners, followees = graph.neighbours(rows, max_fanout)
+        path_owners, candidates = graph.neighbours(followees, max_fanout)
+        path_owners = owners[path_owners]
+
+        # one int64 key per (user, candidate) pair: position in the batch * user count + candidate,
+        # a run of equal sorted keys is one candidate scored by its length
+        keys = np.sort(path_owners.astype(np.int64) * user_count + candidates)
+        starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+        scores = np.diff(np.append(starts, len(keys)))
+        keys = keys[starts]
+
+        # drop candidates the user already follows, and the user
+        all_owners, all_followees = graph.neighbours(rows)
+        excluded = np.sort(
+            np.concatenate(
+                [all_owners.astype(np.int64) * user_count + all_followees, np.arange(len(rows)) * user_count + rows]
+            )
+        )
+        positions = np.searchsorted(keys, excluded)
+        positions = positions[positions < len(keys)]
+        kept = np.ones(len(keys), dtype=bool)
+        kept[positions[keys[positions] == excluded[: len(positions)]]] = False
+        keys, scores = keys[kept], scores[kept]
+        owners, candidates = np.divmod(keys, user_count)
+
+        # best first per user, the sort is stable so equal scores stay in candidate id order
+        top_score = scores.max(initial=0)
+        order = np.argsort(owners * (top_score + 1) + (top_score - scores), kind="stable")
+        owners, candidates, scores = owners[order], candidates[order], scores[order]
+        firsts = np.flatnonzero(np.concatenate([[True], owners[1:] != owners[:-1]]))
+        ranks = np.arange(len(owners)) - np.repeat(firsts, np.diff(np.append(firsts, len(owners))))
+        keep = ranks < top_k
+
+        yield SuggestionBatch(
+            first_user_id=int(graph.user_ids[start]) if start else None,
+            next_user_id=int(graph.user_ids[stop]) if stop < user_count else None,
+            user_ids=graph.user_ids[rows[owners[keep]]],
+            suggested_ids=graph.user_ids[candidates[keep]],
+            scores=scores[keep],
+            ranks=ranks[keep],
+        )
+
+
+def _copy_suggestions(batch):
+    rows = np.empty(len(batch.user_ids), dtype=SUGGESTION_ROW)
+    rows["fields"] = 4
+    rows["user_len"] = rows["suggested_len"] = 8
+    rows["score_len"] = 4
+    rows["rank_len"] = 2
+    rows["user"], rows["suggested"] = batch.user_ids, batch.suggested_ids
+    rows["score"], rows["rank"] = batch.scores, batch.ranks
+
+    quote = connection.ops.quote_name
+    columns = ", ".join(
+        quote(FollowSuggestion._meta.get_field(name).column) for name in ("user", "suggested", "score", "rank")
+    )
+    sql = f"COPY {quote(FollowSuggestion._meta.db_table)} ({columns}) FROM STDIN WITH (FORMAT binary)"
+    with connection.cursor() as cursor:
+        cursor.copy_expert(sql, io.BytesIO(PGCOPY_HEADER + rows.tobytes() + PGCOPY_TRAILER))
+
+
+def store(batch):
+    """Replace the suggestions of the batch's users"""
+    stale = FollowSuggestion.objects.all()
+    if batch.first_user_id is not None:
+        stale = stale.filter(user_id__gte=batch.first_user_id)
+    if batch.next_user_id is not None:
+        stale = stale.filter(user_id__lt=batch.next_user_id)
+
+    with transaction.atomic():
+        stale.delete()
+        if connection.vendor == "postgresql":
+            _copy_suggestions(batch)
+            return
+        FollowSuggestion.objects.bulk_create(
+            (
+                FollowSuggestion(user_id=user_id, suggested_id=suggested_id, score=score, rank=rank)
+                for user_id, suggested_id, score, rank in zip(
+                    batch.user_ids.tolist(), batch.suggested_ids.tolist(), batch.scores.tolist(), batch.ranks.tolist()
+                )
+            ),
+            batch_size=5000,
+        )
+
+
+def refresh(top_k=None, max_fanout=None, batch_paths=None) -> int:
+    """Recompute every user's suggestions, returns how many were stored"""
+    graph = FollowGraph.from_edges(*load_edges())
+    if not len(graph.user_ids):
+        FollowSuggestion.objects.all().delete()
+        return 0
+
+    stored = 0
+    for batch in recommend(
+        graph,
+        top_k or settings.FOLLOW_SUGGESTIONS_TOP_K,
+        max_fanout or settings.FOLLOW_SUGGESTIONS_MAX_FANOUT,
+        batch_paths or settings.FOLLOW_SUGGESTIONS_BATCH_PATHS,
+    ):
+        store(batch)
+        stored += len(batch.user_ids)
+    return stored
@@ -1,10 +1,110 @@
-from celery import shared_task
-from social_media.models import Post
-from user.models import User
+from celery import current_app, shared_task
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DataError, IntegrityError
+from social_media import analytics, images, post_buffer, services, suggestions, timeline
+
+# queues and worker settings are in CELERY_TASK_ROUTES and the CELERY_WORKER_* settings
 
 
 @shared_task
 def create_post(user_id, title, content):
-    user = User.objects.get(pk=user_id)
-    post = Post.objects.create(user=user, title=title, content=content)
-    return post.id
+    """Queue a post (scheduled from the admin), `flush_post_buffer` creates it in a batch.
+
+    The post has no id yet, returns how many posts are waiting in the buffer instead.
+    """
+    waiting = post_buffer.push(user_id, title, content)
+    if waiting >= settings.POST_BATCH_SIZE or current_app.conf.task_always_eager:
+        flush_post_buffer.delay()
+    return waiting
+
+
+def _create_buffered_posts(posts) -> int:
+    """Create a batch, invalid posts and posts the database rejects go to the dead letter queue"""
+    valid = []
+    for post in posts:
+        reason = post_buffer.invalid(post)
+        if reason:
+            post_buffer.dead_letter(post, reason)
+        else:
+            valid.append(post)
+
+    try:
+        return len(services.bulk_create_posts(valid))
+    except (DataError, IntegrityError):
+        pass
+    # one post broke the INSERT, find it by creating the batch row by row
+    created = 0
+    for post in valid:
+        try:
+            created += len(services.bulk_create_posts([post]))
+        except (DataError, IntegrityError) as error:
+            post_buffer.dead_letter(post, str(error))
+    return created
+
+
+@shared_task
+def flush_post_buffer():
+    """Create the queued posts, POST_BATCH_SIZE per INSERT; also runs every POST_BATCH_INTERVAL"""
+    created = 0
+    while True:
+        with post_buffer.take(settings.POST_BATCH_SIZE) as posts:
+            created += _create_buffered_posts(posts)
+        if len(posts) < settings.POST_BATCH_SIZE:
+            return created
+
+
+@shared_task
+def fan_out_post(post_id):
+    return timeline.fan_out_post(post_id)
+
+
+@shared_task
+def fan_out_posts(post_ids):
+    return sum(timeline.fan_out_post(post_id) for post_id in post_ids)
+
+
+@shared_task
+def backfill_timeline(follower_id, followee_id):
+    return timeline.backfill(follower_id, followee_id)
+
+
+@shared_task
+def prune_timeline(follower_id, followee_id):
+    return timeline.prune(follower_id, followee_id)
+
+
+@shared_task
+def backfill_timelines(follower_id, followee_ids):
+    return sum(timeline.backfill(follower_id, followee_id) for followee_id in followee_ids)
+
+
+@shared_task
+def prune_timelines(follower_id, followee_ids):
+    return sum(timeline.prune(follower_id, followee_id) for followee_id in followee_ids)
+
+
+@shared_task
+def process_image(kind, pk, force=False):
+    variants = images.process(kind, pk, force=force)
+    return variants and variants["files"]
+
+
+@shared_task
+def rebuild_counters():
+    call_command("rebuild_counters")
+
+
+@shared_task
+def refresh_follow_suggestions():
+    return suggestions.refresh()
+
+
+@shared_task
+def decay_trending_scores():
+    return services.decay_trending_scores()
+
+
+@shared_task
+def rollup_engagement():
+    return analytics.rollup()
@@ -0,0 +1,150 @@
+"""Write rate limits per user (or client IP) and `throttle_scope`, counted in the default cache.
+
+A sliding window counter: hits are counted in fixed windows and the previous window is weighted
+by how much of it still overlaps the sliding one, so bursts at a window boundary can't double the
+rate. With Redis a request costs one pipelined round trip; other backends (locmem in development
+and tests) fall back to the generic cache API. A rejected request's hits are taken back, so it
+doesn't hold back the client's next requests. Views can charge a request more than one hit
+(`get_throttle_cost`), the bulk endpoints charge one per operation against their own scope.
+"""
+
+import math
+import time
+from dataclasses import dataclass
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import ScopedRateThrottle
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """What `RateLimitHeadersMiddleware` reports as X-RateLimit-* headers"""
+
+    limit: int
+    remaining: int
+    reset: int
+
+
+def _redis_hit(current_key, previous_key, duration, cost):
+    current_key = cache.make_and_validate_key(current_key)
+    previous_key = cache.make_and_validate_key(previous_key)
+    pipeline = cache._cache.get_client(current_key, write=True).pipeline(transaction=False)
+    pipeline.incrby(current_key, cost)
+    pipeline.expire(current_key, 2 * duration)
+    pipeline.get(previous_key)
+    current, _, previous = pipeline.execute()
+    return current, int(previous or 0)
+
+
+def _cache_hit(current_key, previous_key, duration, cost):
+    cache.add(current_key, 0, timeout=2 * duration)
+    current = cache.incr(current_key, cost)
+    return current, cache.get(previous_key, 0)
+
+
+def _redis_refund(current_key, cost):
+    current_key = cache.make_and_validate_key(current_key)
+    cache._cache.get_client(current_key, write=True).decrby(current_key, cost)
+
+
+def _cache_refund(current_key, cost):
+    try:
+        cache.decr(current_key, cost)
+    except ValueError:
+        # expired meanwhile, nothing left to take back
+        pass
+
+
+def _uses_redis():
+    # `cache` is a proxy, the backend itself is in `caches`
+    return isinstance(caches["default"], RedisCache)
+
+
+def hit(key, duration, now=None, cost=1):
+    """Count a request of `key` as `cost` hits.
+
+    Returns (hits in the current window, in the previous one, seconds into the current).
+    """
+    now = time.time() if now is None else now
+    window = int(now // duration)
+    counter = _redis_hit if _uses_redis() else _cache_hit
+    current, previous = counter(f"{key}:{window}", f"{key}:{window - 1}", duration, cost)
+    return current, previous, now - window * duration
+
+
+def refund(key, duration, now, cost=1):
+    """Take back the hits of a rejected request counted by `hit` at `now`"""
+    window = int(now // duration)
+    (_redis_refund if _uses_redis() else _cache_refund)(f"{key}:{window}", cost)
+
+
+def estimate(current, previous, elapsed, duration) -> float:
+    """Hits in the sliding window that ends now"""
+    return previous * (1 - elapsed / duration) + current
+
+
+def wait(current, previous, elapsed, duration, limit, cost=1) -> float:
+    """Seconds until the sliding window has room for `cost` more hits under `limit`"""
+    allowed = limit - cost
+    if current <= allowed:
+        # the previous window's share shrinks linearly until the current one ends
+        excess = estimate(current, previous, elapsed, duration) - allowed
+        return max(excess * duration / previous, 0) if previous else 0
+    # then the current window becomes the previous one and its share shrinks
+    return duration - elapsed + duration * (1 - allowed / current)
+
+
+class SlidingWindowThrottle(ScopedRateThrottle):
+    """Limits unsafe requests to views with a `throttle_scope`, at DEFAULT_THROTTLE_RATES[scope].
+
+    Reads are never throttled. Actions can override the view's scope, e.g.
+    `@action(detail=True, methods=["post"], throttle_scope="follows")`. A view's
+    `get_throttle_cost(request)` sets how many hits a request counts as (default 1). A request
+    costing more than the rate allows could never pass, it's a 400 rather than a 429 to retry.
+    """
+
+    def get_rate(self):
+        # read on every request, so rates follow override_settings
+        return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+
+    def allow_request(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        if self.rate is None:
+            return True
+
+        get_cost = getattr(view, "get_throttle_cost", None)
+        self.cost = get_cost(request) if get_cost else 1
+        if self.cost > self.num_requests:
+            raise ValidationError(
+                f"This request counts as {self.cost} {self.scope} requests, at most {self.num_requests} "
+                f"are allowed per {self.duration} seconds."
+            )
+
+        key, now = self.get_cache_key(request, view), time.time()
+        self.current, self.previous, self.elapsed = hit(key, self.duration, now=now, cost=self.cost)
+        allowed = estimate(self.current, self.previous, self.elapsed, self.duration) <= self.num_requests
+        if not allowed:
+            refund(key, self.duration, now, cost=self.cost)
+            self.current -= self.cost
+
+        hits = estimate(self.current, self.previous, self.elapsed, self.duration)
+        request._request.rate_limit = RateLimit(
+            limit=self.num_requests,
+            remaining=max(self.num_requests - math.ceil(hits), 0),
+            reset=math.ceil(self.duration - self.elapsed),
+        )
+        return allowed
+
+    def wait(self):
+        return wait(self.current, self.previous, self.elapsed, self.duration, self.num_requests, self.cost)
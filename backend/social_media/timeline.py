@@ -0,0 +1,82 @@
+"""Home timeline: fan-out-on-write for regular authors, fan-out-on-read for popular ones."""
+
+from django.conf import settings
+from django.db.models import F, Q
+from social_media.models import Follow, Post, Profile, TimelineEntry
+
+BATCH_SIZE = 1000
+
+
+def is_fan_out_author(user_id) -> bool:
+    """Authors above the follower threshold are merged into feeds at read time instead."""
+    return not Profile.objects.filter(
+        user_id=user_id,
+        followers_count__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS,
+    ).exists()
+
+
+def _insert_entries(entries):
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out_post(post_id):
+    """Push `post_id` into its author's own timeline and the timeline of every follower."""
+    post = Post.objects.filter(pk=post_id).only("id", "user_id", "post_date").first()
+    if post is None:
+        return 0
+
+    batch = [TimelineEntry(user_id=post.user_id, post_id=post.id, created_at=post.post_date)]
+    total = 0
+    if is_fan_out_author(post.user_id):
+        follower_ids = Follow.objects.filter(followee_id=post.user_id).values_list("follower_id", flat=True)
+        for follower_id in follower_ids.iterator(chunk_size=BATCH_SIZE):
+            batch.append(TimelineEntry(user_id=follower_id, post_id=post.id, created_at=post.post_date))
+            if len(batch) == BATCH_SIZE:
+                _insert_entries(batch)
+                total += len(batch)
+                batch = []
+    _insert_entries(batch)
+    return total + len(batch)
+
+
+def backfill(follower_id, followee_id):
+    """Copy the latest posts of a freshly followed author into the follower's timeline."""
+    if not is_fan_out_author(followee_id):
+        return 0
+
+    posts = Post.objects.filter(user_id=followee_id).order_by("-post_date", "-id").values_list("id", "post_date")
+    entries = [
+        TimelineEntry(user_id=follower_id, post_id=post_id, created_at=post_date)
+        for post_id, post_date in posts[: settings.TIMELINE_BACKFILL_SIZE]
+    ]
+    _insert_entries(entries)
+    return len(entries)
+
+
+def prune(follower_id, followee_id):
+    """Drop an unfollowed author's posts from the follower's timeline."""
+    deleted, _ = TimelineEntry.objects.filter(user_id=follower_id, post__user_id=followee_id).delete()
+    return deleted
+
+
+def feed_queryset(user):
+    """Posts of `user`'s timeline (own and fanned-out posts) + posts of followed popular authors.
+
+    Entries carry their post's date, so a page is a range scan of the user's entries joined to
+    posts. Only readers following popular authors also read those authors' posts.
+    """
+    popular_followee_ids = list(
+        Follow.objects.filter(
+            follower_id=user.id,
+            followee__profiles__followers_count__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS,
+        ).values_list("followee_id", flat=True)
+    )
+    if not popular_followee_ids:
+        return Post.objects.filter(timeline_entries__user_id=user.id).annotate(
+            timeline_date=F("timeline_entries__created_at")
+        )
+
+    fanned_out = TimelineEntry.objects.filter(user_id=user.id).values("post_id")
+    return Post.objects.filter(Q(id__in=fanned_out) | Q(user_id__in=popular_followee_ids)).annotate(
+        timeline_date=F("post_date")
+    )
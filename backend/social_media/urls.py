@@ -1,15 +1,32 @@
 from django.urls import include, path
 from rest_framework import routers
+from social_media.async_views import (
+    AsyncFollowersView,
+    AsyncFollowingView,
+    AsyncPostDetailView,
+    AsyncPostListView,
+    AsyncProfileDetailView,
+)
 from social_media.views import (  # ProfileViewSet,
     AddCommentAPIView,
+    AnalyticsAPIView,
+    BulkCommentsAPIView,
+    BulkFollowsAPIView,
+    BulkLikesAPIView,
     CommentViewSet,
+    ExportAPIView,
+    FeedViewSet,
     FollowersViewSet,
     FollowingViewSet,
+    FollowSuggestionsView,
+    ImageVariantView,
     MyProfileFollowersViewSet,
     MyProfileFollowingViewSet,
     PostViewSet,
     ProfileDetailView,
+    ResponseCacheStatsView,
     RetrieveProfileAPIView,
+    SearchViewSet,
     ToggleLikeAPIView,
     UpdateProfileAPIView,
     UserPostsViewSet,
@@ -19,6 +36,8 @@ app_name = "social_media"
 
 router = routers.DefaultRouter()
 router.register("posts", PostViewSet, basename="posts")
+router.register("feed", FeedViewSet, basename="feed")
+router.register("search", SearchViewSet, basename="search")
 
 my_profile_router = routers.DefaultRouter()
 my_profile_router.register("user-posts", UserPostsViewSet, basename="user-posts")
@@ -33,8 +52,20 @@ profile_router.register("followers", FollowersViewSet, basename="user-followers"
 
 urlpatterns = [
     path("", include(router.urls)),
+    path("bulk/likes/", BulkLikesAPIView.as_view(), name="bulk-likes"),
+    path("bulk/follows/", BulkFollowsAPIView.as_view(), name="bulk-follows"),
+    path("bulk/comments/", BulkCommentsAPIView.as_view(), name="bulk-comments"),
+    path("cache-stats/", ResponseCacheStatsView.as_view(), name="cache-stats"),
+    path(
+        "images/<str:kind>/<int:pk>/<str:size>.<str:extension>",
+        ImageVariantView.as_view(),
+        name="image-variant",
+    ),
     path("my-profile/", RetrieveProfileAPIView.as_view(), name="my-profile"),
     path("my-profile/<int:user_id>/", UpdateProfileAPIView.as_view()),
+    path("my-profile/analytics/", AnalyticsAPIView.as_view(), name="my-profile-analytics"),
+    path("my-profile/export/", ExportAPIView.as_view(), name="my-profile-export"),
+    path("my-profile/suggestions/", FollowSuggestionsView.as_view(), name="my-profile-suggestions"),
     path("my-profile/", include(my_profile_router.urls)),
     path(
         "my-profile/user-posts/<int:post_id>/add_comment/",
@@ -62,4 +93,18 @@ urlpatterns = [
         name="profile-detail",
     ),
     path("profile/<str:username>/", include(profile_router.urls)),
+    # async (ASGI) versions of the hot read endpoints
+    path("async/posts/", AsyncPostListView.as_view(), name="async-posts-list"),
+    path("async/posts/<int:pk>/", AsyncPostDetailView.as_view(), name="async-posts-detail"),
+    path("async/profile/<str:username>/", AsyncProfileDetailView.as_view(), name="async-profile-detail"),
+    path(
+        "async/profile/<str:username>/followers/",
+        AsyncFollowersView.as_view(),
+        name="async-user-followers",
+    ),
+    path(
+        "async/profile/<str:username>/following/",
+        AsyncFollowingView.as_view(),
+        name="async-user-following",
+    ),
 ]
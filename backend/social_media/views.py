@@ -1,19 +1,49 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import redirect
+from django.utils import timezone
 from rest_framework import generics, mixins, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
-from social_media import services
-from social_media.mixins import FollowMixin, UnfollowMixin
-from social_media.models import Comment, Follow, Post, Profile
+from social_media import (
+    analytics,
+    export,
+    follow_graph,
+    images,
+    response_cache,
+    search,
+    services,
+    signals,
+    tasks,
+    timeline,
+)
+from social_media.mixins import FollowMixin, UnfollowMixin, ViewerStateMixin
+from social_media.models import Comment, EngagementRollup, Follow, FollowSuggestion, Post, Profile
+from social_media.pagination import (
+    CommentCursorPagination,
+    FeedCursorPagination,
+    FollowCursorPagination,
+    LikeCursorPagination,
+    PostCursorPagination,
+    SearchPagination,
+)
 from social_media.permissions import IsAuthorOrReadOnly
 from social_media.serializers import (
+    BulkCommentSerializer,
+    BulkFollowSerializer,
+    BulkLikeSerializer,
     CommentDetailSerializer,
     CommentListProfileSerializer,
+    CommentListSerializer,
     CommentProfileSerializer,
     CommentSerializer,
     EmptySerializer,
@@ -22,11 +52,14 @@ from social_media.serializers import (
     FollowingDetailSerializer,
     FollowingListSerializer,
     FollowSerializer,
+    FollowSuggestionSerializer,
+    LikeSerializer,
     MyProfileSerializer,
     PostDetailSerializer,
     PostListSerializer,
     PostSerializer,
     ProfileSerializer,
+    UserSearchSerializer,
 )
 
 
@@ -34,11 +67,89 @@ class RetrieveProfileAPIView(generics.ListAPIView):
     queryset = Profile.objects.select_related("user")
     serializer_class = MyProfileSerializer
     permission_classes = (IsAuthenticated,)
+    pagination_class = None
 
     def get_queryset(self):
         """ListAPIView with user filtering - like RetrieveAPIView (detail url not suitable)"""
         return self.queryset.filter(user=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        # the viewer's own profile version, which `conditional` always includes
+        validators, not_modified = response_cache.conditional(request)
+        if not_modified is not None:
+            return not_modified
+        return response_cache.with_validators(super().list(request, *args, **kwargs), validators)
+
+
+class ExportAPIView(APIView):
+    """Streams the user's data: ?export_format=ndjson|csv&sections=posts,comments,likes,follows"""
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        # `format` is taken by DRF's renderer negotiation
+        export_format = request.query_params.get("export_format", "ndjson")
+        if export_format not in export.FORMATS:
+            raise ValidationError({"export_format": f"Choose one of: {', '.join(export.FORMATS)}"})
+
+        sections = request.query_params.get("sections")
+        sections = sections.split(",") if sections else export.SECTIONS
+        unknown = set(sections) - set(export.SECTIONS)
+        if unknown:
+            raise ValidationError({"sections": f"Unknown: {', '.join(sorted(unknown))}"})
+
+        rows = export.export_rows(request.user.id, sections)
+        response = StreamingHttpResponse(export.encode(rows, export_format), content_type=export.FORMATS[export_format])
+        response["Content-Disposition"] = f'attachment; filename="{request.user.username}-export.{export_format}"'
+        return response
+
+
+class AnalyticsAPIView(APIView):
+    """Engagement the user received per bucket: ?period=day|week&since=YYYY-MM-DD&until=YYYY-MM-DD
+
+    Reads only the rollups `analytics.rollup()` keeps, which lag behind by up to ANALYTICS_ROLLUP_INTERVAL.
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        period = request.query_params.get("period", EngagementRollup.Period.DAY)
+        if period not in EngagementRollup.Period.values:
+            raise ValidationError({"period": f"Choose one of: {', '.join(EngagementRollup.Period.values)}"})
+
+        dates = {}
+        for param in ("since", "until"):
+            value = request.query_params.get(param)
+            try:
+                dates[param] = date.fromisoformat(value) if value else None
+            except ValueError:
+                raise ValidationError({param: "Use YYYY-MM-DD"})
+        until = dates["until"] or timezone.localdate()
+        since = dates["since"] or until - timedelta(weeks=12 if period == EngagementRollup.Period.WEEK else 4)
+        if len(analytics.buckets(period, since, until)) > settings.ANALYTICS_MAX_BUCKETS:
+            raise ValidationError({"since": f"At most {settings.ANALYTICS_MAX_BUCKETS} {period}s per request"})
+
+        return Response({"period": period, "results": analytics.series(request.user.id, period, since, until)})
+
+
+class FollowSuggestionsView(generics.ListAPIView):
+    """Who to follow: users followed by the user's followees, from the last nightly refresh"""
+
+    serializer_class = FollowSuggestionSerializer
+    permission_classes = (IsAuthenticated,)
+    pagination_class = None
+
+    def get_queryset(self):
+        user_id = self.request.user.id
+        # one read of the (user, rank) index, leaving out users followed since the refresh
+        followed = Follow.objects.filter(follower_id=user_id, followee_id=OuterRef("suggested_id"))
+        return (
+            FollowSuggestion.objects.filter(user_id=user_id)
+            .exclude(Exists(followed))
+            .select_related("suggested")
+            .order_by("rank")
+        )
+
 
 class UpdateProfileAPIView(generics.UpdateAPIView):
     """No need to override get_queryset bc it's profile page"""
@@ -49,10 +160,12 @@ class UpdateProfileAPIView(generics.UpdateAPIView):
     lookup_field = "user_id"
 
 
-class UserPostsViewSet(viewsets.ModelViewSet):
+class UserPostsViewSet(ViewerStateMixin, viewsets.ModelViewSet):
     queryset = Post.objects.select_related("user")
     serializer_class = PostSerializer
     permission_classes = (IsAuthenticated,)
+    pagination_class = PostCursorPagination
+    throttle_scope = "posts"
 
     def get_queryset(self):
         queryset = self.queryset.filter(user_id=self.request.user.id)
@@ -67,10 +180,18 @@ class UserPostsViewSet(viewsets.ModelViewSet):
             departure_time = datetime.strptime(post_date, "%Y-%m-%d").date()
             queryset = queryset.filter(post_date__date=departure_time)
 
-        return queryset.order_by("id")
+        return queryset
 
     def perform_create(self, serializer):
-        serializer.save(user_id=self.request.user.id)
+        with transaction.atomic():
+            post = serializer.save(user_id=self.request.user.id)
+            services.update_profile_counters(self.request.user.id, posts_count=1)
+            transaction.on_commit(lambda: tasks.fan_out_post.delay(post.id))
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            services.update_profile_counters(instance.user_id, posts_count=-1)
 
     def get_serializer_class(self):
         # if self.action == "list":
@@ -85,10 +206,12 @@ class UserPostsViewSet(viewsets.ModelViewSet):
         return self.serializer_class
 
 
-class PostViewSet(FollowMixin, UnfollowMixin, viewsets.ModelViewSet):
-    queryset = Post.objects.all()
+class PostViewSet(ViewerStateMixin, FollowMixin, UnfollowMixin, viewsets.ModelViewSet):
+    queryset = Post.objects.select_related("user")
     serializer_class = PostSerializer
     permission_classes = (IsAuthorOrReadOnly,)
+    pagination_class = PostCursorPagination
+    throttle_scope = "posts"
 
     def get_permissions(self):
         if self.action in ["follow_post_author", "unfollow_post_author"]:
@@ -96,35 +219,122 @@ class PostViewSet(FollowMixin, UnfollowMixin, viewsets.ModelViewSet):
         return super().get_permissions()
 
     def get_serializer_class(self):
-        if self.action == "list":
+        if self.action in ["list", "trending"]:
             return PostListSerializer
 
         if self.action == "retrieve":
             return PostDetailSerializer
 
-        if self.action == "add_comment":
+        if self.action in ["add_comment", "comments"]:
             return CommentSerializer
 
+        if self.action == "likes":
+            return LikeSerializer
+
         if self.action in ["follow_post_author", "unfollow_post_author"]:
             return EmptySerializer
 
         return self.serializer_class
 
+    def get_queryset(self):
+        if self.action == "retrieve":
+            return self.queryset.with_recent_activity(settings.POST_DETAIL_PREVIEW_SIZE)
+        return self.queryset
+
+    def list(self, request, *args, **kwargs):
+        if not response_cache.versions_enabled():
+            return super().list(request, *args, **kwargs)
+
+        # validators need the page's posts, known once the page was built at this collection version
+        version, scopes = response_cache.page_scopes(request, "posts")
+        validators = None
+        if scopes is not None:
+            validators, not_modified = response_cache.conditional(request, *scopes)
+            if not_modified is not None:
+                return not_modified
+
+        if not response_cache.is_enabled():
+            response = super().list(request, *args, **kwargs)
+            response_cache.remember_page(request, "posts", version, [post["id"] for post in response.data["results"]])
+            return response_cache.with_validators(response, validators)
+
+        def build_page():
+            page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+            return page, self.paginator.get_next_link(), self.paginator.get_previous_link()
+
+        with response_cache.track("posts-list") as outcome:
+            data = response_cache.post_page(request, "posts", build_page, PostListSerializer, outcome)
+        return response_cache.with_validators(Response(data), validators)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not response_cache.versions_enabled():
+            return super().retrieve(request, *args, **kwargs)
+
+        try:
+            pk = int(kwargs["pk"])
+        except ValueError:
+            raise Http404
+        # version stamps are only created for posts that exist
+        if not self.get_queryset().filter(pk=pk).exists():
+            raise Http404
+
+        validators, not_modified = response_cache.conditional(request, f"post:{pk}")
+        if not_modified is not None:
+            return not_modified
+        if not response_cache.is_enabled():
+            return response_cache.with_validators(super().retrieve(request, *args, **kwargs), validators)
+
+        with response_cache.track("posts-detail") as outcome:
+            fragments = response_cache.post_fragments(
+                [pk], PostDetailSerializer, request, outcome, queryset=self.get_queryset()
+            )
+        if pk not in fragments:
+            raise Http404
+        return response_cache.with_validators(
+            Response(response_cache.with_viewer_fields([fragments[pk]], request.user)[0]), validators
+        )
+
     def perform_create(self, serializer):
-        serializer.save(user_id=self.request.user.id)
+        with transaction.atomic():
+            post = serializer.save(user_id=self.request.user.id)
+            services.update_profile_counters(self.request.user.id, posts_count=1)
+            transaction.on_commit(lambda: tasks.fan_out_post.delay(post.id))
 
-    @action(detail=True, methods=["post"], url_path="follow")
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            services.update_profile_counters(instance.user_id, posts_count=-1)
+
+    @action(detail=True, methods=["post"], url_path="follow", throttle_scope="follows")
     def follow_post_author(self, request, pk=None):
         post = self.get_object()
         author = post.user
         return self._follow_author(request, author)
 
-    @action(detail=True, methods=["post"], url_path="unfollow")
+    @action(detail=True, methods=["post"], url_path="unfollow", throttle_scope="follows")
     def unfollow_post_author(self, request, pk=None):
         post = self.get_object()
         author = post.user
         return self._unfollow_author(request, author)
 
+    @action(detail=False, methods=["get"], pagination_class=None)
+    def trending(self, request):
+        """Top TRENDING_SIZE posts by trending score, a read of the partial trending index"""
+        posts = self.get_queryset().filter(trending_score__gt=0).order_by("-trending_score", "-id")
+        return Response(self.get_serializer(posts[: settings.TRENDING_SIZE], many=True).data)
+
+    @action(detail=True, methods=["get"], pagination_class=CommentCursorPagination)
+    def comments(self, request, pk=None):
+        post = self.get_object()
+        page = self.paginate_queryset(post.comments.select_related("user"))
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @action(detail=True, methods=["get"], pagination_class=LikeCursorPagination)
+    def likes(self, request, pk=None):
+        post = self.get_object()
+        page = self.paginate_queryset(post.likes.select_related("user"))
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
     @action(detail=True, methods=["get"])
     def redirect_to_profile(self, request, pk=None):
         post = self.get_object()
@@ -133,6 +343,51 @@ class PostViewSet(FollowMixin, UnfollowMixin, viewsets.ModelViewSet):
         return redirect(profile_url)
 
 
+class FeedViewSet(ViewerStateMixin, mixins.ListModelMixin, GenericViewSet):
+    """Home timeline: posts of followed authors, newest first"""
+
+    serializer_class = PostListSerializer
+    permission_classes = (IsAuthenticated,)
+    pagination_class = FeedCursorPagination
+
+    def get_queryset(self):
+        return timeline.feed_queryset(self.request.user).select_related("user")
+
+
+class SearchViewSet(ViewerStateMixin, mixins.ListModelMixin, GenericViewSet):
+    """Ranked search: ?q=<words>&type=posts|comments|users (posts by default)"""
+
+    permission_classes = (IsAuthenticated,)
+    pagination_class = SearchPagination
+    search_types = ("posts", "comments", "users")
+
+    def get_search_type(self):
+        search_type = self.request.query_params.get("type", "posts")
+        if search_type not in self.search_types:
+            raise ValidationError({"type": f"Choose one of: {', '.join(self.search_types)}"})
+        return search_type
+
+    def get_queryset(self):
+        query = self.request.query_params.get("q", "").strip()
+        if not query:
+            raise ValidationError({"q": "This query parameter is required"})
+
+        search_type = self.get_search_type()
+        if search_type == "comments":
+            return search.search_comments(query).select_related("user", "post")
+        if search_type == "users":
+            return search.search_users(query)
+        return search.search_posts(query).select_related("user")
+
+    def get_serializer_class(self):
+        search_type = self.get_search_type()
+        if search_type == "comments":
+            return CommentListSerializer
+        if search_type == "users":
+            return UserSearchSerializer
+        return PostListSerializer
+
+
 class FollowingViewSet(
     FollowMixin,
     UnfollowMixin,
@@ -144,6 +399,8 @@ class FollowingViewSet(
     queryset = Follow.objects.select_related("follower", "followee")
     serializer_class = FollowSerializer
     permission_classes = (IsAuthorOrReadOnly,)
+    pagination_class = FollowCursorPagination
+    throttle_scope = "follows"
 
     def get_queryset(self):
         """Username filtering by followee"""
@@ -156,7 +413,7 @@ class FollowingViewSet(
         if username:
             queryset = queryset.filter(followee__username__icontains=username)
 
-        return queryset.order_by("id")
+        return queryset
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -170,6 +427,16 @@ class FollowingViewSet(
 
         return self.serializer_class
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            if not follow_graph.unfollow(instance.follower_id, instance.followee_id):
+                return
+            services.update_follow_counters(instance.follower_id, instance.followee_id, -1)
+            signals.follow_changed.send(
+                sender=Follow, follower_id=instance.follower_id, followee_id=instance.followee_id
+            )
+            transaction.on_commit(lambda: tasks.prune_timeline.delay(instance.follower_id, instance.followee_id))
+
     @action(detail=True, methods=["post"], url_path="follow")
     def follow_user(self, request, pk=None, **kwargs):
         follow = self.get_object()
@@ -200,7 +467,7 @@ class MyProfileFollowingViewSet(FollowingViewSet):
         if username:
             queryset = queryset.filter(followee__username__icontains=username)
 
-        return queryset.order_by("id")
+        return queryset
 
 
 class FollowersViewSet(
@@ -214,6 +481,8 @@ class FollowersViewSet(
     queryset = Follow.objects.all()
     serializer_class = FollowSerializer
     permission_classes = (IsAuthorOrReadOnly,)
+    pagination_class = FollowCursorPagination
+    throttle_scope = "follows"
 
     def get_queryset(self):
         username = self.kwargs["username"]
@@ -224,7 +493,7 @@ class FollowersViewSet(
         if username:
             queryset = queryset.filter(follower__username__icontains=username)
 
-        return queryset.order_by("id")
+        return queryset
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -238,6 +507,16 @@ class FollowersViewSet(
 
         return self.serializer_class
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            if not follow_graph.unfollow(instance.follower_id, instance.followee_id):
+                return
+            services.update_follow_counters(instance.follower_id, instance.followee_id, -1)
+            signals.follow_changed.send(
+                sender=Follow, follower_id=instance.follower_id, followee_id=instance.followee_id
+            )
+            transaction.on_commit(lambda: tasks.prune_timeline.delay(instance.follower_id, instance.followee_id))
+
     @action(detail=True, methods=["post"], url_path="follow")
     def follow_user(self, request, pk=None, **kwargs):
         follow = self.get_object()
@@ -267,7 +546,7 @@ class MyProfileFollowersViewSet(FollowersViewSet):
         if username:
             queryset = queryset.filter(follower__username__icontains=username)
 
-        return queryset.order_by("id")
+        return queryset
 
 
 class CommentViewSet(
@@ -281,6 +560,8 @@ class CommentViewSet(
     queryset = Comment.objects.select_related("user", "post")
     serializer_class = CommentProfileSerializer
     permission_classes = (IsAuthenticated,)  # for enter profile - it should be user
+    pagination_class = CommentCursorPagination
+    throttle_scope = "comments"
 
     def get_permissions(self):
         """write this method to explicitly, it no mandatory"""
@@ -296,7 +577,7 @@ class CommentViewSet(
         if post_title:
             queryset = queryset.filter(post__title__icontains=post_title)
 
-        return queryset.order_by("id")
+        return queryset
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -310,13 +591,18 @@ class CommentViewSet(
 
         return self.serializer_class
 
-    @action(detail=True, methods=["post"], url_path="follow")
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            services.update_post_counters(instance.post_id, comments_count=-1)
+
+    @action(detail=True, methods=["post"], url_path="follow", throttle_scope="follows")
     def follow_post_author(self, request, pk=None):
         comment = self.get_object()
         author = comment.post.user
         return self._follow_author(request, author)
 
-    @action(detail=True, methods=["post"], url_path="unfollow")
+    @action(detail=True, methods=["post"], url_path="unfollow", throttle_scope="follows")
     def unfollow_post_author(self, request, pk=None):
         comment = self.get_object()
         author = comment.post.user
@@ -332,6 +618,7 @@ class CommentViewSet(
 
 class AddCommentAPIView(APIView):
     permission_classes = (IsAuthenticated,)
+    throttle_scope = "comments"
 
     def post(self, request, post_id):
         try:
@@ -346,30 +633,90 @@ class AddCommentAPIView(APIView):
         }
         serializer = CommentSerializer(data=comment_data)
         serializer.is_valid(raise_exception=True)
-        serializer.save(user=request.user, post=post)
+        with transaction.atomic():
+            serializer.save(user=request.user, post=post)
+            services.update_post_counters(post.id, comments_count=1)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+class BulkOperationsAPIView(generics.GenericAPIView):
+    """POST {"operations": [...]} applied in one transaction, returns a result per operation"""
+
+    permission_classes = (IsAuthenticated,)
+    # syncs get their own, larger budget of operations, apart from the single-write scopes
+    throttle_scope = "bulk"
+    apply_operations = None
+
+    def get_throttle_cost(self, request):
+        """Every operation counts against the bulk rate"""
+        operations = request.data.get("operations") if isinstance(request.data, dict) else None
+        if not isinstance(operations, list) or not operations:
+            return 1
+        return min(len(operations), settings.BULK_MAX_OPERATIONS)
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = self.apply_operations(request.user, serializer.validated_data["operations"])
+        return Response({"results": results})
+
+
+class BulkLikesAPIView(BulkOperationsAPIView):
+    serializer_class = BulkLikeSerializer
+    apply_operations = staticmethod(services.bulk_like)
+
+
+class BulkFollowsAPIView(BulkOperationsAPIView):
+    serializer_class = BulkFollowSerializer
+    apply_operations = staticmethod(services.bulk_follow)
+
+
+class BulkCommentsAPIView(BulkOperationsAPIView):
+    serializer_class = BulkCommentSerializer
+    apply_operations = staticmethod(services.bulk_comment)
+
+
 class ToggleLikeAPIView(APIView):
+    """POST toggles the like, PUT/DELETE set the wanted state (safe to retry)"""
+
     permission_classes = (IsAuthenticated,)
+    throttle_scope = "likes"
 
     def post(self, request, post_id):
         try:
-            post = Post.objects.get(pk=post_id)
+            liked = services.toggle_like(Post(pk=post_id), request.user)
         except Post.DoesNotExist:
             return Response({"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND)
-        if services.is_liked(post, request.user):
-            services.remove_like(post, request.user)
-            return Response({"message": "Like removed successfully"}, status=status.HTTP_200_OK)
-        services.add_like(post, request.user)
 
-        return Response({"message": "Like added successfully"}, status=status.HTTP_200_OK)
+        if liked:
+            return Response({"message": "Like added successfully"}, status=status.HTTP_200_OK)
+        return Response({"message": "Like removed successfully"}, status=status.HTTP_200_OK)
+
+    def put(self, request, post_id):
+        try:
+            created = services.add_like(Post(pk=post_id), request.user)
+        except Post.DoesNotExist:
+            return Response({"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        if created:
+            return Response({"message": "Like added successfully"}, status=status.HTTP_201_CREATED)
+        return Response({"message": "Post is already liked"}, status=status.HTTP_200_OK)
+
+    def delete(self, request, post_id):
+        try:
+            removed = services.remove_like(Post(pk=post_id), request.user)
+        except Post.DoesNotExist:
+            return Response({"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        if removed:
+            return Response({"message": "Like removed successfully"}, status=status.HTTP_200_OK)
+        return Response({"message": "Post is not liked"}, status=status.HTTP_200_OK)
 
 
 class ProfileDetailView(generics.RetrieveAPIView):
     """Only for view other profiles (not to follow, RetrieveProfileAPIView doesn't support)"""
 
-    queryset = Profile.objects.all()
+    queryset = Profile.objects.select_related("user")
     serializer_class = ProfileSerializer
     permission_classes = (IsAuthenticated,)
     # lookup_field = "username"
@@ -377,3 +724,56 @@ class ProfileDetailView(generics.RetrieveAPIView):
     def get_object(self):
         username = self.kwargs["username"]
         return self.get_queryset().get(user__username=username)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not response_cache.versions_enabled():
+            return super().retrieve(request, *args, **kwargs)
+
+        user_id = get_user_model().objects.filter(username=kwargs["username"]).values_list("id", flat=True).first()
+        if user_id is None:
+            raise Http404
+
+        validators, not_modified = response_cache.conditional(request, f"profile:{user_id}")
+        if not_modified is not None:
+            return not_modified
+        if not response_cache.is_enabled():
+            return response_cache.with_validators(super().retrieve(request, *args, **kwargs), validators)
+
+        def build():
+            context = {**self.get_serializer_context(), "viewer_state": response_cache.EMPTY_VIEWER_STATE}
+            return self.get_serializer(self.get_object(), context=context).data
+
+        with response_cache.track("profile-detail") as outcome:
+            data = response_cache.profile_payload(request, user_id, build, outcome)
+        return response_cache.with_validators(Response(data), validators)
+
+
+class ImageVariantView(APIView):
+    """Redirects to a resized image, to the original while the upload task renders it"""
+
+    permission_classes = (AllowAny,)
+
+    def get(self, request, kind, pk, size, extension):
+        if (
+            kind not in images.IMAGE_FIELDS
+            or size not in settings.IMAGE_VARIANT_SIZES
+            or extension not in images.FORMATS
+        ):
+            raise Http404
+
+        url, rendered = images.variant_url(kind, pk, size, extension)
+        if url is None:
+            raise Http404
+        # the task never ran or failed, queue it again, deduplicated across requests
+        if not rendered and images.claim_render(kind, pk):
+            tasks.process_image.delay(kind, pk)
+        return redirect(url)
+
+
+class ResponseCacheStatsView(APIView):
+    """Hit rate and latency of the cached post and profile endpoints"""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(response_cache.get_stats())
@@ -15,6 +15,7 @@ import sys
 from datetime import timedelta
 from pathlib import Path
 
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -31,6 +32,8 @@ SECRET_KEY = os.environ["DJANGO_SECRET_KEY"]
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.environ.get("DJANGO_DEBUG", "") != "False"
 
+TESTING = "test" in sys.argv
+
 ALLOWED_HOSTS = []
 
 INTERNAL_IPS = [
@@ -56,16 +59,19 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "social_media.middleware.QueryMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "social_media.middleware.ReplicaRoutingMiddleware",
+    "social_media.middleware.RateLimitHeadersMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
-ENABLE_DEBUG_TOOLBAR = DEBUG and "test" not in sys.argv
+ENABLE_DEBUG_TOOLBAR = DEBUG and not TESTING
 if ENABLE_DEBUG_TOOLBAR:
     INSTALLED_APPS += [
         "debug_toolbar",
@@ -99,13 +105,71 @@ WSGI_APPLICATION = "social_media_api.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# seconds a connection is reused across requests, checked before reuse (CONN_HEALTH_CHECKS)
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", 60))
+
+
+def postgres_database(host, **extra):
+    database = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ["POSTGRES_DB"],
+        "USER": os.environ["POSTGRES_USER"],
+        "PASSWORD": os.environ["POSTGRES_PASSWORD"],
+        "HOST": host,
+        "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+        "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        **extra,
+    }
+    return database
+
+
+if os.environ.get("POSTGRES_HOST"):
+    DATABASES = {"default": postgres_database(os.environ["POSTGRES_HOST"])}
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+        }
     }
+
+# read replicas, comma separated hosts: safe-method requests read from them, see social_media/db_router.py
+REPLICA_DATABASES = []
+for number, host in enumerate(filter(None, os.environ.get("POSTGRES_REPLICA_HOSTS", "").split(",")), start=1):
+    REPLICA_DATABASES.append(f"replica_{number}")
+    DATABASES[f"replica_{number}"] = postgres_database(host.strip(), TEST={"MIRROR": "default"})
+
+DATABASE_ROUTERS = ["social_media.db_router.ReplicaRouter"]
+# after a write, a user's reads stay on the primary this long (covers replication lag)
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 5))
+
+
+# covering indexes (Index.include) are PostgreSQL-only, SQLite just builds the key part
+SILENCED_SYSTEM_CHECKS = ["models.W040"]
+
+
+CACHES = {
+    "default": (
+        {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": os.environ["REDIS_URL"]}
+        if os.environ.get("REDIS_URL")
+        else {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    )
 }
 
+# invalidation has to reach every process, the caches below are only on by default with Redis
+SHARED_CACHE = bool(os.environ.get("REDIS_URL"))
+# shared payloads of post list/detail and profile detail, see social_media/response_cache.py
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", str(SHARED_CACHE and not TESTING)) == "True"
+RESPONSE_CACHE_TIMEOUT = 5 * 60
+# version stamps outlive every payload keyed by them, an expired stamp only changes the validators
+RESPONSE_CACHE_VERSION_TIMEOUT = 7 * 24 * 60 * 60
+# ETag/Last-Modified on post and profile reads from the same version stamps, with or without cached payloads
+CONDITIONAL_GET_ENABLED = os.environ.get("CONDITIONAL_GET_ENABLED", str(SHARED_CACHE and not TESTING)) == "True"
+# followee/follower id sets of users, see social_media/follow_graph.py
+FOLLOW_GRAPH_CACHE_ENABLED = os.environ.get("FOLLOW_GRAPH_CACHE_ENABLED", str(SHARED_CACHE and not TESTING)) == "True"
+FOLLOW_GRAPH_CACHE_TIMEOUT = 60 * 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -147,27 +211,48 @@ STATIC_URL = "static/"
 MEDIA_ROOT = BASE_DIR / "media"
 MEDIA_URL = "/media/"
 
+# longest side in px of the variants rendered from uploaded images, see social_media/images.py
+IMAGE_VARIANT_SIZES = {"thumb": 160, "medium": 640, "large": 1280}
+IMAGE_VARIANT_QUALITY = 80
+# seconds before a variant request queues the render of an image again, in case the task failed
+IMAGE_RENDER_RETRY = 5 * 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": ("rest_framework_simplejwt.authentication.JWTAuthentication",),
+    "DEFAULT_AUTHENTICATION_CLASSES": ("user.authentication.ClaimsJWTAuthentication",),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
-    # "DEFAULT_THROTTLE_CLASSES": [
-    #     "rest_framework.throttling.AnonRateThrottle",
-    #     "rest_framework.throttling.UserRateThrottle",
-    # ],
-    # "DEFAULT_THROTTLE_RATES": {"anon": "100/day", "user": "1000/day"},
+    "DEFAULT_PAGINATION_CLASS": "social_media.pagination.IdCursorPagination",
+    "PAGE_SIZE": int(os.environ.get("API_PAGE_SIZE", 20)),
+    "DEFAULT_THROTTLE_CLASSES": ("social_media.throttling.SlidingWindowThrottle",),
+    # writes per user (or client IP) of views with that `throttle_scope`, THROTTLE_RATE_<SCOPE> to change one;
+    # no limits in tests, which override them where throttling is tested
+    "DEFAULT_THROTTLE_RATES": {
+        scope: None if TESTING else os.environ.get(f"THROTTLE_RATE_{scope.upper()}", rate)
+        for scope, rate in {
+            "likes": "120/min",
+            "comments": "30/min",
+            "follows": "60/min",
+            "posts": "30/hour",
+            # operations of the bulk/ endpoints, has to fit BULK_MAX_OPERATIONS
+            "bulk": "5000/hour",
+        }.items()
+    },
 }
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=10),  # minutes=5
     "REFRESH_TOKEN_LIFETIME": timedelta(days=10),
     "ROTATE_REFRESH_TOKENS": False,
+    "TOKEN_OBTAIN_SERIALIZER": "user.serializers.ClaimsTokenObtainPairSerializer",
 }
 
+# seconds a user row read by ClaimsJWTAuthentication is cached, also how long a deactivated user keeps access
+AUTH_USER_CACHE_TIMEOUT = 60
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Social Media API",
     "DESCRIPTION": "API for social media",
@@ -181,8 +266,111 @@ SPECTACULAR_SETTINGS = {
     },
 }
 
-CELERY_BROKER_URL = "redis://localhost:6379"
-CELERY_RESULT_BACKEND = "redis://localhost:6379"
+# tests run tasks eagerly, the in-memory broker only holds the post buffer
+CELERY_BROKER_URL = "memory://" if TESTING else os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379")
+CELERY_RESULT_BACKEND = os.environ.get("CELERY_RESULT_BACKEND", "redis://localhost:6379")
 CELERY_TIMEZONE = "Europe/Kyiv"
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
+# run tasks in-process for tests and for local setups without a worker
+CELERY_TASK_ALWAYS_EAGER = TESTING or os.environ.get("CELERY_TASK_ALWAYS_EAGER") == "True"
+# one queue per kind of work, so a burst of image processing or fan-out doesn't delay the rest;
+# run workers per queue, e.g. `celery -A social_media_api worker -Q fanout -c 8`
+CELERY_TASK_ROUTES = {
+    "social_media.tasks.create_post": {"queue": "posts"},
+    "social_media.tasks.flush_post_buffer": {"queue": "posts"},
+    "social_media.tasks.fan_out_post": {"queue": "fanout"},
+    "social_media.tasks.fan_out_posts": {"queue": "fanout"},
+    "social_media.tasks.backfill_*": {"queue": "fanout"},
+    "social_media.tasks.prune_*": {"queue": "fanout"},
+    "social_media.tasks.process_image": {"queue": "media"},
+    "social_media.tasks.rebuild_counters": {"queue": "counters"},
+    "social_media.tasks.decay_trending_scores": {"queue": "counters"},
+    "social_media.tasks.rollup_engagement": {"queue": "counters"},
+    # minutes of CPU and up to ~1 GB per run, keep it off the queues of short tasks
+    "social_media.tasks.refresh_follow_suggestions": {"queue": "suggestions"},
+}
+# ack after the task ran, a worker that dies mid-task leaves it on the queue for another one
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+# with late acks a prefetched message waits behind a long task, keep prefetch low
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.environ.get("CELERY_WORKER_PREFETCH_MULTIPLIER", 1))
+CELERY_WORKER_CONCURRENCY = (
+    int(os.environ["CELERY_WORKER_CONCURRENCY"]) if "CELERY_WORKER_CONCURRENCY" in os.environ else None
+)
+# scheduled posts are buffered and written POST_BATCH_SIZE per INSERT, or every POST_BATCH_INTERVAL seconds
+POST_BATCH_SIZE = int(os.environ.get("POST_BATCH_SIZE", 100))
+POST_BATCH_INTERVAL = int(os.environ.get("POST_BATCH_INTERVAL", 5))
+# trending posts: a like/comment adds its weight to the post's score, beat halves scores every
+# TRENDING_HALF_LIFE seconds (every TRENDING_DECAY_INTERVAL, by the time elapsed since the last decay),
+# below TRENDING_MIN_SCORE a post drops out
+TRENDING_LIKE_WEIGHT = 1.0
+TRENDING_COMMENT_WEIGHT = 3.0
+TRENDING_HALF_LIFE = int(os.environ.get("TRENDING_HALF_LIFE", 6 * 60 * 60))
+TRENDING_DECAY_INTERVAL = 10 * 60
+TRENDING_MIN_SCORE = 0.05
+TRENDING_SIZE = 50
+# engagement analytics, see social_media/analytics.py
+ANALYTICS_ROLLUP_INTERVAL = int(os.environ.get("ANALYTICS_ROLLUP_INTERVAL", 5 * 60))
+ANALYTICS_ROLLUP_LAG = 60
+ANALYTICS_ROLLUP_BATCH = 50_000
+ANALYTICS_MAX_BUCKETS = 366
+CELERY_BEAT_SCHEDULE = {
+    "flush-post-buffer": {"task": "social_media.tasks.flush_post_buffer", "schedule": POST_BATCH_INTERVAL},
+    "rebuild-counters": {"task": "social_media.tasks.rebuild_counters", "schedule": crontab(minute=0, hour=4)},
+    "decay-trending-scores": {"task": "social_media.tasks.decay_trending_scores", "schedule": TRENDING_DECAY_INTERVAL},
+    "rollup-engagement": {"task": "social_media.tasks.rollup_engagement", "schedule": ANALYTICS_ROLLUP_INTERVAL},
+    "refresh-follow-suggestions": {
+        "task": "social_media.tasks.refresh_follow_suggestions",
+        "schedule": crontab(minute=30, hour=3),
+    },
+}
+# friend-of-friend suggestions, see social_media/suggestions.py
+FOLLOW_SUGGESTIONS_TOP_K = 20
+FOLLOW_SUGGESTIONS_MAX_FANOUT = int(os.environ.get("FOLLOW_SUGGESTIONS_MAX_FANOUT", 200))
+FOLLOW_SUGGESTIONS_BATCH_PATHS = int(os.environ.get("FOLLOW_SUGGESTIONS_BATCH_PATHS", 20_000_000))
+
+# authors with more followers are merged into feeds on read instead of fanned out on write
+TIMELINE_FANOUT_MAX_FOLLOWERS = int(os.environ.get("TIMELINE_FANOUT_MAX_FOLLOWERS", 10_000))
+# how many recent posts of a newly followed author land in the follower's timeline
+TIMELINE_BACKFILL_SIZE = 50
+
+# request metrics, scraped from /metrics with "Authorization: Bearer $METRICS_TOKEN"
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "True") == "True"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+# max SQL queries per endpoint ("<view>.<action>"), exceeding it logs a warning (raises in tests)
+QUERY_BUDGETS = {
+    "PostViewSet.list": 3,
+    "PostViewSet.retrieve": 6,
+    "PostViewSet.comments": 2,
+    "PostViewSet.likes": 2,
+    "UserPostsViewSet.list": 3,
+    # +1 query for the followed popular authors, merged into the timeline on read
+    "FeedViewSet.list": 4,
+    "SearchViewSet.list": 4,
+    "ProfileDetailView.get": 7,
+    "PostViewSet.trending": 3,
+    "CommentViewSet.list": 1,
+    "FollowSuggestionsView.get": 1,
+    "AnalyticsAPIView.get": 1,
+    "ToggleLikeAPIView.post": 6,
+    "BulkLikesAPIView.post": 10,
+    "BulkFollowsAPIView.post": 10,
+    "BulkCommentsAPIView.post": 10,
+    # async views authenticate by token, +1 query when the user row isn't cached
+    "AsyncPostListView.get": 4,
+    "AsyncPostDetailView.get": 6,
+    "AsyncProfileDetailView.get": 5,
+    "AsyncFollowersView.get": 2,
+    "AsyncFollowingView.get": 2,
+}
+QUERY_BUDGET_STRICT = TESTING
+
+# max operations per request of the bulk/ endpoints
+BULK_MAX_OPERATIONS = 1000
+
+# rows fetched per round trip by the streaming data export
+EXPORT_CHUNK_SIZE = 2000
+
+# latest comments/likes embedded in the post detail, the rest is paged at posts/<id>/comments|likes/
+POST_DETAIL_PREVIEW_SIZE = 20
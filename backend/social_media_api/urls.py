@@ -19,6 +19,7 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
+from social_media.metrics import metrics_view
 from social_media_api import settings
 
 urlpatterns = [
@@ -26,6 +27,7 @@ urlpatterns = [
     path("api/v1/social_media/", include("social_media.urls", namespace="social_media")),
     path("api/v1/user/", include("user.urls", namespace="user")),
     path("__debug__/", include("debug_toolbar.urls")),
+    path("metrics", metrics_view, name="metrics"),
     path("api/v1/doc/", SpectacularAPIView.as_view(), name="schema"),
     path(
         "api/v1/doc/swagger-ui/",
@@ -0,0 +1,76 @@
+from asgiref.sync import sync_to_async
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from user.models import ClaimsUser, User, aget_cached_user
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWT authentication that doesn't load the user row on every request.
+
+    The user is a `ClaimsUser` built from the id and username claims added by
+    `ClaimsTokenObtainPairSerializer`; the rest of the row comes from the user cache, which
+    saves of a user invalidate. is_active is checked on every request, which loads the cached
+    row, so is_staff and is_active are never older than AUTH_USER_CACHE_TIMEOUT, while the
+    username changes with the next access token. Tokens issued without the claims, or
+    CHECK_REVOKE_TOKEN, fall back to the database lookup.
+    """
+
+    def get_claims_user(self, validated_token):
+        """Deferred user built from the token claims, None when the token can't be trusted for it"""
+        if api_settings.CHECK_REVOKE_TOKEN:
+            return None
+        try:
+            claims = [validated_token[claim] for claim in (api_settings.USER_ID_CLAIM, "username")]
+        except KeyError:
+            return None
+        return ClaimsUser.from_db(None, list(ClaimsUser.CLAIM_FIELDS), claims)
+
+    def get_user(self, validated_token):
+        user = self.get_claims_user(validated_token)
+        if user is None:
+            return super().get_user(validated_token)
+
+        try:
+            is_active = user.is_active
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+    def get_token_user_id(self, request):
+        """User id claim of the request's valid access token, None without one, never queries"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        try:
+            return self.get_validated_token(raw_token).get(api_settings.USER_ID_CLAIM)
+        except InvalidToken:
+            return None
+
+    async def aauthenticate(self, request):
+        """`authenticate` for async views, reads the cached user row with the async cache API"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_claims_user(validated_token)
+        if user is None:
+            return await sync_to_async(super().get_user)(validated_token), validated_token
+
+        values = await aget_cached_user(user.pk)
+        if values is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        user.load_deferred(values)
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user, validated_token
@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.core.cache import cache
 from django.db import models
 from django.utils.translation import gettext as _
 
@@ -50,3 +52,72 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.username
+
+
+def _cache_key(user_id) -> str:
+    return f"auth_user:{user_id}"
+
+
+def get_cached_user(user_id) -> dict | None:
+    """Field values of a user row, read through a cache kept for AUTH_USER_CACHE_TIMEOUT seconds."""
+    key = _cache_key(user_id)
+    values = cache.get(key)
+    if values is None:
+        values = User.objects.filter(pk=user_id).values(*_user_attnames()).first()
+        if values is None:
+            return None
+        cache.set(key, values, settings.AUTH_USER_CACHE_TIMEOUT)
+    return values
+
+
+async def aget_cached_user(user_id) -> dict | None:
+    """`get_cached_user` for async views."""
+    key = _cache_key(user_id)
+    values = await cache.aget(key)
+    if values is None:
+        values = await User.objects.filter(pk=user_id).values(*_user_attnames()).afirst()
+        if values is None:
+            return None
+        await cache.aset(key, values, settings.AUTH_USER_CACHE_TIMEOUT)
+    return values
+
+
+# the password hash stays out of the shared cache, with last_login which auth doesn't read either,
+# a ClaimsUser loads them from the row on access
+UNCACHED_FIELDS = frozenset({"password", "last_login"})
+
+
+def _user_attnames() -> list:
+    return [field.attname for field in User._meta.concrete_fields if field.attname not in UNCACHED_FIELDS]
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(_cache_key(user_id))
+
+
+class ClaimsUser(User):
+    """User built from access token claims, every other field is deferred.
+
+    Deferred fields are loaded all at once from `get_cached_user` on first access, rather than
+    with one query per field, so a request that only needs the id or username of the user runs
+    no query for it at all. Permissions (is_staff, is_superuser) always come from the row.
+    """
+
+    CLAIM_FIELDS = ("id", "username")
+
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None):
+        deferred = self.get_deferred_fields()
+        if not fields or not deferred.issuperset(fields) or not UNCACHED_FIELDS.isdisjoint(fields):
+            return super().refresh_from_db(using, fields)
+
+        values = get_cached_user(self.pk)
+        if values is None:
+            raise User.DoesNotExist("User matching the token claims does not exist.")
+        self.load_deferred(values)
+
+    def load_deferred(self, values):
+        for attname in self.get_deferred_fields() - UNCACHED_FIELDS:
+            setattr(self, attname, values[attname])
@@ -0,0 +1,16 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from user.models import ClaimsUser, User, invalidate_cached_user
+
+
+# a proxy model sends its own signals, request users are ClaimsUsers
+@receiver(signal=post_save, sender=User)
+@receiver(signal=post_save, sender=ClaimsUser)
+@receiver(signal=post_delete, sender=User)
+@receiver(signal=post_delete, sender=ClaimsUser)
+def invalidate_user(sender, instance, **kwargs):
+    """Any save (API, admin, shell) drops the cached row"""
+    invalidate_cached_user(instance.pk)
+    # and again once committed, a request may have cached the old row meanwhile
+    transaction.on_commit(lambda: invalidate_cached_user(instance.pk))
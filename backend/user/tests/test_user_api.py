@@ -1,8 +1,11 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from user.models import ClaimsUser, get_cached_user, invalidate_cached_user
 
 CREATE_USER_URL = reverse("user:create")
 TOKEN_URL = reverse("user:token_obtain_pair")
@@ -151,3 +154,106 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(self.user.email, payload["email"])
         self.assertTrue(self.user.check_password(payload["password"]))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class ClaimsTokenAuthenticationTests(TestCase):
+    """Test requests authenticated with the claims of a JWT access token"""
+
+    def setUp(self):
+        cache.clear()
+        self.payload = {"email": "test@test.com", "password": "testpass"}
+        self.user = create_user(username="tester", **self.payload)
+        self.client = APIClient()
+
+    def authenticate(self):
+        access = self.client.post(TOKEN_URL, self.payload).data["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        return access
+
+    def test_token_carries_user_claims(self):
+        token = AccessToken(self.authenticate())
+
+        self.assertEqual(token["user_id"], self.user.id)
+        self.assertEqual(token["username"], "tester")
+        # permissions are read from the cached row, not trusted from a long-lived token
+        self.assertNotIn("is_staff", token)
+
+    def test_user_row_is_read_once_per_cache_timeout(self):
+        self.authenticate()
+
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+        with self.assertNumQueries(0):
+            cached = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached.data, res.data)
+        self.assertEqual(cached.data["email"], self.user.email)
+
+    def test_claims_user_defers_other_fields(self):
+        user = ClaimsUser.from_db(None, list(ClaimsUser.CLAIM_FIELDS), [self.user.id, "tester"])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(user.username, "tester")
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, self.user.email)
+            self.assertTrue(user.is_active)
+        self.assertEqual(user, self.user)
+
+    def test_password_hash_is_not_cached(self):
+        user = ClaimsUser.from_db(None, list(ClaimsUser.CLAIM_FIELDS), [self.user.id, "tester"])
+        self.assertTrue(user.is_active)
+
+        self.assertNotIn("password", get_cached_user(self.user.id))
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password(self.payload["password"]))
+
+    def test_update_invalidates_cached_user(self):
+        self.authenticate()
+        self.client.get(ME_URL)
+
+        res = self.client.patch(ME_URL, {"email": "new@test.com"})
+        me = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(me.data["email"], "new@test.com")
+
+    def test_demoted_staff_loses_access_with_the_same_token(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.authenticate()
+        url = reverse("social_media:cache-stats")
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        # saved outside the API, e.g. from the admin
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_staff = False
+            self.user.save()
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_inactive_user_is_rejected(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        invalidate_cached_user(self.user.id)
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user_is_rejected(self):
+        self.authenticate()
+        self.user.delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_token_without_claims_falls_back_to_user_lookup(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["username"], "tester")